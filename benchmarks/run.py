@@ -0,0 +1,152 @@
+"""
+Benchmark the layers, Sequential chains and generators on synthetic frames.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output new.json --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+import cv2
+import numpy as np
+
+from cv2_utils import GaussianFilter, HSVFilter, RoiSelector, PolygonMask, HoughCircleDetector, Sequential
+from cv2_utils.video_capture import Generator
+from cv2_utils.recording import Recorder
+from cv2_utils.stats import RollingHistogram
+from benchmarks.synthetic import RESOLUTIONS, make_frame, make_video, make_image
+from benchmarks.startup import bench_startup
+
+LAYER_NS = '/cv2_utils_benchmark/'
+
+
+def measure(fn, repeat, warmup=2):
+    """
+    :return: throughput in calls per second and latency summary in ms
+    """
+    for _ in range(warmup):
+        fn()
+    histogram = RollingHistogram(repeat)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        histogram.add(time.perf_counter() - t)
+    total = time.perf_counter() - start
+    return {'fps': repeat / total, 'latency_ms': histogram.summary(scale=1e3)}
+
+
+def build_layers(width, height):
+    hsv_low = HSVFilter(LAYER_NS + 'hsv_low', low_H=0, high_H=10, low_S=80, high_S=255, low_V=80, high_V=255)
+    hsv_high = HSVFilter(LAYER_NS + 'hsv_high', low_H=170, high_H=180, low_S=80, high_S=255, low_V=80, high_V=255)
+
+    polygon_mask = PolygonMask(layer_name=LAYER_NS + 'polygon')
+    polygon_mask.contour[:] = [((width // 4, height // 4),), ((width // 2, height // 8),),
+                               ((3 * width // 4, height // 2),), ((width // 3, 3 * height // 4),)]
+    polygon_mask.contour_changed = True
+
+    tiled = Sequential([GaussianFilter(LAYER_NS + 'gaussian', ksize=5, sigma=0),
+                        HSVFilter(LAYER_NS + 'hsv_low', low_H=0, high_H=10, low_S=80, high_S=255, low_V=80, high_V=255)])
+    tiled.enable_tiling()
+
+    return {
+        'GaussianFilter': GaussianFilter(LAYER_NS + 'gaussian', ksize=5, sigma=0),
+        'HSVFilter': hsv_low,
+        'CompositeHSVFilter': hsv_low + hsv_high,
+        'RoiSelector': RoiSelector(width // 2, height // 2, layer_name=LAYER_NS + 'roi'),
+        'PolygonMask': polygon_mask,
+        'HoughCircleDetector': HoughCircleDetector(LAYER_NS + 'hough'),
+        'Sequential': Sequential([RoiSelector(width // 2, height // 2, layer_name=LAYER_NS + 'roi'),
+                                  GaussianFilter(LAYER_NS + 'gaussian', ksize=5, sigma=0), hsv_low]),
+        'TiledSequential': tiled,
+    }
+
+
+def bench_resolution(name, repeat, tmp_dir):
+    width, height = RESOLUTIONS[name]
+    frame = make_frame(width, height)
+    results = {}
+
+    for layer_name, layer in build_layers(width, height).items():
+        results[layer_name] = measure(lambda: layer.inference(frame), repeat)
+
+    video_path = make_video(os.path.join(tmp_dir, '%s.avi' % name), width, height, n_frames=repeat + 2)
+    gen = Generator.get_generator(video_path, True)
+    results['VideoGenerator'] = measure(gen.read, repeat)
+
+    with Recorder(os.path.join(tmp_dir, '%s.rec' % name)) as recorder:
+        for _ in range(repeat + 2):
+            recorder.write(frame)
+    gen = Generator.get_generator(recorder.path, True)
+    results['RecordingGenerator'] = measure(gen.read, repeat)
+
+    image_path = make_image(os.path.join(tmp_dir, '%s.jpg' % name), width, height)
+    results['ImageGenerator'] = measure(lambda: Generator.get_generator(image_path, False).read(), repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: list of (benchmark, resolution, ratio) whose throughput dropped by more than threshold
+    """
+    regressions = []
+    for bench, by_resolution in results['results'].items():
+        for resolution, result in by_resolution.items():
+            base = baseline['results'].get(bench, {}).get(resolution)
+            if base is None:
+                continue
+            ratio = result['fps'] / base['fps']
+            print("%-22s %-6s %10.1f fps  x%.2f" % (bench, resolution, result['fps'], ratio))
+            if ratio < 1 - threshold:
+                regressions.append((bench, resolution, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resolutions", nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--repeat", type=int, default=50, help="measured calls per benchmark")
+    parser.add_argument("--skip-startup", action='store_true', help="do not measure import and construction time")
+    parser.add_argument("--output", type=str, default='benchmark.json', help="JSON result path")
+    parser.add_argument("--baseline", type=str, default=None, help="JSON result of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative throughput drop reported as regression")
+    FLAGS = parser.parse_args()
+
+    results = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                        'opencv': cv2.__version__, 'numpy': np.__version__, 'platform': platform.platform(),
+                        'cpu_count': os.cpu_count(), 'cv2_threads': cv2.getNumThreads(), 'repeat': FLAGS.repeat},
+               'results': {}}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for resolution in FLAGS.resolutions:
+            for bench, result in bench_resolution(resolution, FLAGS.repeat, tmp_dir).items():
+                results['results'].setdefault(bench, {})[resolution] = result
+                print("%-22s %-6s %10.1f fps  p50 %.2f ms" % (bench, resolution, result['fps'],
+                                                              result['latency_ms']['p50']))
+
+        if not FLAGS.skip_startup:
+            video_path = make_video(os.path.join(tmp_dir, 'startup.avi'), 64, 64, n_frames=2)
+            for bench, result in bench_startup(video_path).items():
+                results['results'].setdefault(bench, {})['startup'] = result
+                print("%-22s %-6s %10.2f ms" % (bench, 'startup', result['latency_ms']['mean']))
+
+    with open(FLAGS.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if FLAGS.baseline:
+        with open(FLAGS.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, FLAGS.threshold)
+        for bench, resolution, ratio in regressions:
+            print("regression: %s %s x%.2f" % (bench, resolution, ratio))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
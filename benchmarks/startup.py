@@ -0,0 +1,50 @@
+import os
+import sys
+import subprocess
+
+from cv2_utils.stats import RollingHistogram
+
+IMPORT_CODE = """
+import time
+start = time.perf_counter()
+import cv2_utils
+print(time.perf_counter() - start)
+"""
+
+IMPORT_LAYERS_CODE = """
+import time
+start = time.perf_counter()
+from cv2_utils import *
+print(time.perf_counter() - start)
+"""
+
+CONSTRUCT_CODE = """
+import sys
+import time
+import cv2_utils
+cv2_utils.VideoCapture  # import video_capture first, only the construction is measured
+start = time.perf_counter()
+cv2_utils.VideoCapture(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+
+def time_fresh_process(code, repeat, *args):
+    """
+    run code in fresh interpreters, the code prints the seconds it measured itself
+    """
+    histogram = RollingHistogram(repeat)
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code] + list(args), check=True, stdout=subprocess.PIPE,
+                                env=dict(os.environ), universal_newlines=True).stdout
+        histogram.add(float(output.strip().splitlines()[-1]))
+    summary = histogram.summary(scale=1e3)
+    return {'fps': 1e3 / summary['mean'], 'latency_ms': summary}
+
+
+def bench_startup(video_path, repeat=5):
+    return {
+        'import': time_fresh_process(IMPORT_CODE, repeat),
+        'import_layers': time_fresh_process(IMPORT_LAYERS_CODE, repeat),
+        'VideoCapture_construct': time_fresh_process(CONSTRUCT_CODE, repeat, video_path),
+    }
@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+
+RESOLUTIONS = {'vga': (640, 480), '1080p': (1920, 1080), '4k': (3840, 2160)}
+
+
+def make_frame(width, height, index=0, seed=0):
+    """
+    deterministic BGR frame with a colour gradient background and a few moving circles
+    """
+    rng = np.random.RandomState(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = (x[None, :] + index) % 256
+    frame[..., 1] = y[:, None]
+    frame[..., 2] = 128
+
+    scale = min(width, height) / 480.
+    for _ in range(8):
+        cx, cy = rng.randint(0, width), rng.randint(0, height)
+        radius = int(rng.randint(12, 25) * scale)
+        color = tuple(int(c) for c in rng.randint(0, 256, 3))
+        cv2.circle(frame, ((cx + 3 * index) % width, cy), radius, color, -1)
+    return frame
+
+
+def make_video(path, width, height, n_frames=60, fps=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    assert writer.isOpened(), "cannot open video writer for %s" % path
+    for i in range(n_frames):
+        writer.write(make_frame(width, height, i))
+    writer.release()
+    return path
+
+
+def make_image(path, width, height):
+    assert cv2.imwrite(path, make_frame(width, height))
+    return path
@@ -1,3 +1,31 @@
-from .layers import *
-from .video_capture import VideoCapture
-from .sequential import Sequential
\ No newline at end of file
+# submodules are imported when one of their names is first accessed, so that importing cv2_utils stays cheap
+import importlib
+
+_LAZY = {
+    'Layer': '.layers', 'ParamLayer': '.layers', 'SourceLayer': '.layers',
+    'GaussianFilter': '.layers', 'HoughCircleDetector': '.layers', 'HSVFilter': '.layers',
+    'CompositeHSVFilter': '.layers', 'RoiSelector': '.layers', 'PolygonMask': '.layers',
+    'SinkLayer': '.layers', 'VideoSink': '.layers', 'ImageSequenceSink': '.layers',
+    'VideoCapture': '.video_capture',
+    'MultiCapture': '.multi_capture',
+    'Sequential': '.sequential',
+    'Recorder': '.recording',
+    'Frame': '.frame',
+    'ThreadBackend': '.backends', 'ProcessBackend': '.backends',
+    'TiledExecutor': '.tiling',
+    'set_display_mode': '.display',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
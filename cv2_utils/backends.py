@@ -0,0 +1,321 @@
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from queue import Queue, Empty, Full
+
+import cv2
+import numpy as np
+
+from .frame import Frame
+from .layers import SinkLayer
+
+
+class Backend:
+    """
+    Execution backend of a Sequential with source. start() is called when the Sequential starts iterating,
+    and next() returns the processed frames in the order of the source.
+    """
+
+    def start(self, model):
+        pass
+
+    def next(self):
+        raise StopIteration
+
+    def stop(self):
+        pass
+
+
+class _End:
+    pass
+
+
+class _Error:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class ThreadBackend(Backend):
+    def __init__(self, stages=None, queue_size=2):
+        """
+
+        :param stages: number of layers in each stage, e.g. [1, 2] runs the first layer in a stage
+                        and the next two layers in another stage, one stage per layer if None
+        :param queue_size: max number of frames waiting between two stages
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.threads = []
+        self.queues = []
+        self.stop_event = threading.Event()
+
+    def _split(self, layers):
+        if self.stages is None:
+            return [[layer] for layer in layers]
+        assert sum(self.stages) == len(layers), "stages should cover all layers"
+        groups, i = [], 0
+        for n in self.stages:
+            groups.append(layers[i:i + n])
+            i += n
+        return groups
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except Empty:
+                pass
+        return _End()
+
+    def _source_worker(self, model, out_q):
+        while not self.stop_event.is_set():
+            try:
+                item = model.read_source()
+            except StopIteration:
+                item = _End()
+            except Exception as e:
+                item = _Error(e)
+            if not self._put(out_q, item) or isinstance(item, (_End, _Error)):
+                return
+
+    def _stage_worker(self, model, layers, in_q, out_q):
+        while True:
+            item = self._get(in_q)
+            if not isinstance(item, (_End, _Error)):
+                try:
+                    item = model.run_layers(item, layers)
+                except Exception as e:
+                    item = _Error(e)
+            if not self._put(out_q, item) or isinstance(item, (_End, _Error)):
+                return
+
+    def start(self, model):
+        assert not model.reuse_buffers, "the buffers of a stage would be overwritten while the next stage reads them"
+        self.stop()
+        self.stop_event.clear()
+
+        groups = self._split(model.layers)
+        self.queues = [Queue(maxsize=self.queue_size) for _ in range(len(groups) + 1)]
+        self.threads = [threading.Thread(target=self._source_worker, args=(model, self.queues[0]),
+                                         daemon=True)]
+        for i, layers in enumerate(groups):
+            self.threads.append(threading.Thread(target=self._stage_worker,
+                                                 args=(model, layers, self.queues[i], self.queues[i + 1]),
+                                                 daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def next(self):
+        if not self.threads:
+            raise StopIteration
+        item = self._get(self.queues[-1])
+        if isinstance(item, _End):
+            self.stop()
+            raise StopIteration
+        if isinstance(item, _Error):
+            self.stop()
+            raise item.exc
+        return item
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=1)
+        self.threads = []
+
+
+def _slot_view(shm, slot, slot_nbytes, shape, dtype):
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_nbytes)
+
+
+def _process_task(layers, in_shm, out_shm, slot_nbytes, task):
+    seq, slot, meta, obj = task
+    img = _slot_view(in_shm, slot, slot_nbytes, *meta) if meta is not None else obj
+    try:
+        for layer in layers:
+            img = layer(img)
+    except Exception as e:
+        return seq, slot, None, _Error(e)
+
+    if isinstance(img, np.ndarray) and img.nbytes <= slot_nbytes:
+        _slot_view(out_shm, slot, slot_nbytes, img.shape, img.dtype)[...] = img
+        return seq, slot, (img.shape, img.dtype.str), None
+    return seq, slot, None, img
+
+
+def _process_worker(layers, in_name, out_name, slot_nbytes, cv2_threads, tasks, results):
+    if cv2_threads is not None:
+        cv2.setNumThreads(cv2_threads)
+    for layer in layers:  # no GUI in worker processes
+        if getattr(layer, 'debug', False):
+            layer.debug = False
+
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            results.put(_process_task(layers, in_shm, out_shm, slot_nbytes, task))
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+
+class ProcessBackend(Backend):
+    """
+    Run replicas of the layer chain in worker processes. Frames are passed through shared memory ring buffers
+    instead of being pickled, and results are returned in the order of the source.
+
+    The layers are copied to the workers when the iteration starts, so the parameters loaded by the ConfigLoader
+    and the current state of each layer are reproduced in every worker. Parameters changed later in the main
+    process (e.g. by the debug GUI) are not synchronized, and the debug GUI is disabled in the workers.
+    Sink layers at the end of the chain stay in the main process and write the results in order, sinks in the
+    middle of the chain are not supported.
+    """
+
+    def __init__(self, workers=None, slots=None, start_method='spawn', cv2_threads=1):
+        """
+
+        :param workers: number of worker processes, number of cpus if None
+        :param slots: number of frames in the ring buffer, i.e. max frames in flight, 2 * workers if None
+        :param start_method: multiprocessing start method of workers
+        :param cv2_threads: number of OpenCV threads in each worker, OpenCV default if None
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.slots = slots or 2 * self.workers
+        self.start_method = start_method
+        self.cv2_threads = cv2_threads
+
+        self.processes = []
+        self.shms = []
+        self.sinks = []
+
+    def start(self, model):
+        self.stop()
+
+        self.model = model
+        self.source_done = False
+        self.next_seq = 0
+        self.submitted = 0
+        self.done = {}
+        self.envelopes = {}
+        self.free_slots = list(range(self.slots))
+
+        layers = list(model.layers)
+        self.sinks = []
+        while layers and isinstance(layers[-1], SinkLayer):
+            self.sinks.insert(0, layers.pop())
+        assert not any(isinstance(layer, SinkLayer) for layer in layers), \
+            "sinks in the middle of the chain could not run in worker processes"
+
+        try:
+            first_frame = model.read_source()
+        except StopIteration:
+            self.source_done = True
+            return
+
+        img = first_frame.img if isinstance(first_frame, Frame) else first_frame
+        self.slot_nbytes = max(img.nbytes if isinstance(img, np.ndarray) else 0, 1)
+        self.shms = [shared_memory.SharedMemory(create=True, size=self.slots * self.slot_nbytes) for _ in range(2)]
+
+        try:
+            ctx = multiprocessing.get_context(self.start_method)
+            self.tasks = ctx.Queue()
+            self.results = ctx.Queue()
+            for _ in range(self.workers):
+                process = ctx.Process(target=_process_worker,
+                                      args=(layers, self.shms[0].name, self.shms[1].name, self.slot_nbytes,
+                                            self.cv2_threads, self.tasks, self.results),
+                                      daemon=True)
+                process.start()
+                self.processes.append(process)
+        except Exception:  # e.g. a layer could not be pickled, do not leak the shared memory
+            self.stop()
+            raise
+
+        self._submit(first_frame)
+
+    def _submit(self, frame):
+        if isinstance(frame, Frame):  # the envelope stays here, only the image goes through the workers
+            self.envelopes[self.submitted] = frame
+            frame = frame.img
+        slot = self.free_slots.pop()
+        if isinstance(frame, np.ndarray) and frame.nbytes <= self.slot_nbytes:
+            _slot_view(self.shms[0], slot, self.slot_nbytes, frame.shape, frame.dtype)[...] = frame
+            task = (self.submitted, slot, (frame.shape, frame.dtype.str), None)
+        else:
+            task = (self.submitted, slot, None, frame)
+        self.tasks.put(task)
+        self.submitted += 1
+
+    def _fill(self):
+        while self.free_slots and not self.source_done:
+            try:
+                frame = self.model.read_source()
+            except StopIteration:
+                self.source_done = True
+                break
+            self._submit(frame)
+
+    def _wait_result(self):
+        while True:
+            try:
+                return self.results.get(timeout=0.5)
+            except Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    self.stop()
+                    raise RuntimeError("worker process died")
+
+    def next(self):
+        if not self.processes:
+            raise StopIteration
+
+        self._fill()
+        if self.next_seq >= self.submitted:
+            self.stop()
+            raise StopIteration
+
+        while self.next_seq not in self.done:
+            seq, slot, meta, obj = self._wait_result()
+            self.done[seq] = (slot, meta, obj)
+
+        slot, meta, obj = self.done.pop(self.next_seq)
+        self.next_seq += 1
+        if meta is not None:
+            obj = _slot_view(self.shms[1], slot, self.slot_nbytes, *meta).copy()
+        self.free_slots.append(slot)
+
+        if isinstance(obj, _Error):
+            self.stop()
+            raise obj.exc
+        envelope = self.envelopes.pop(self.next_seq - 1, None)
+        if envelope is not None:
+            obj = envelope.replace(obj)
+        for sink in self.sinks:
+            obj = sink(obj)
+        return obj
+
+    def stop(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+        for shm in self.shms:
+            shm.close()
+            shm.unlink()
+        self.shms = []
@@ -0,0 +1,125 @@
+"""
+GUI calls of the package (imshow, waitKey, debug windows) go through this module, so that they could run
+inline as before, on a dedicated display thread, or not at all (headless).
+The mode could also be set with the CV2_UTILS_DISPLAY environment variable.
+"""
+import os
+import threading
+
+import cv2
+
+INLINE = 'inline'
+THREAD = 'thread'
+HEADLESS = 'headless'
+
+_mode = os.environ.get('CV2_UTILS_DISPLAY', INLINE)
+assert _mode in [INLINE, THREAD, HEADLESS], "invalid display mode %s" % _mode
+
+
+def set_display_mode(mode):
+    """
+    :param mode: 'inline': GUI calls in the frame loop, 'thread': frames are shown by a display thread,
+                 'headless': no GUI call at all
+    """
+    global _mode
+    assert mode in [INLINE, THREAD, HEADLESS], "invalid display mode %s" % mode
+    _mode = mode
+
+
+def get_display_mode():
+    return _mode
+
+
+class DisplayThread:
+    """
+    Show the latest frame of each window at its own rate, frames submitted faster are dropped.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, fps=30):
+        self.period_ms = max(int(1000 / fps), 1)
+        self.lock = threading.Lock()
+        self.frames = {}  # window -> (frame, render)
+        self.calls = []
+        self.last_key = -1
+        self.dropped_frames = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def get(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = DisplayThread()
+            return cls._instance
+
+    def show(self, window, frame, render=None):
+        with self.lock:
+            if window in self.frames:
+                self.dropped_frames += 1
+            self.frames[window] = (frame, render)
+
+    def call(self, fn):
+        with self.lock:
+            self.calls.append(fn)
+
+    def pop_key(self):
+        with self.lock:
+            key, self.last_key = self.last_key, -1
+        return key
+
+    def run(self):
+        while True:
+            with self.lock:
+                calls, self.calls = self.calls, []
+                frames, self.frames = self.frames, {}
+
+            for fn in calls:
+                fn()
+            for window, (frame, render) in frames.items():
+                cv2.imshow(window, render(frame) if render is not None else frame)
+
+            key = cv2.waitKey(self.period_ms)  # pumps GUI events and paces the thread
+            if key != -1:
+                with self.lock:
+                    self.last_key = key
+
+
+def show(window, frame, render=None, wait=False):
+    """
+    :param render: function returning the image to show from frame, only called if the frame is really shown
+    :param wait: pump GUI events after showing the frame in inline mode, for windows shown outside a VideoCapture loop
+    """
+    if _mode == HEADLESS:
+        return
+    if _mode == THREAD:
+        DisplayThread.get().show(window, frame, render)
+        return
+    cv2.imshow(window, render(frame) if render is not None else frame)
+    if wait:
+        cv2.waitKey(1)
+
+
+def call(fn):
+    """
+    run a GUI setup function (namedWindow, createTrackbar, ...) on the GUI thread
+    """
+    if _mode == HEADLESS:
+        return
+    if _mode == THREAD:
+        DisplayThread.get().call(fn)
+        return
+    fn()
+
+
+def wait_key():
+    """
+    pump GUI events, return the last pressed key or -1
+    """
+    if _mode == HEADLESS:
+        return -1
+    if _mode == THREAD:
+        return DisplayThread.get().pop_key()
+    return cv2.waitKey(1)
@@ -0,0 +1,28 @@
+import time
+
+
+class Frame:
+    """
+    Envelope of a frame with its sequence number in the source and the time (time.monotonic) it was captured
+    and entered the pipeline. Layers process the image and the envelope is passed through with the same metadata.
+    gap is the number of frames missing before this one, set by the Sequential returning it.
+    """
+    __slots__ = ('img', 'seq', 'capture_time', 'ingest_time', 'gap')
+
+    def __init__(self, img, seq=0, capture_time=None, ingest_time=None):
+        self.img = img
+        self.seq = seq
+        self.capture_time = capture_time if capture_time is not None else time.monotonic()
+        self.ingest_time = ingest_time if ingest_time is not None else self.capture_time
+        self.gap = 0
+
+    def replace(self, img):
+        """
+        :return: envelope of img with the metadata of this frame
+        """
+        frame = Frame(img, self.seq, self.capture_time, self.ingest_time)
+        frame.gap = self.gap
+        return frame
+
+    def __repr__(self):
+        return "Frame(seq=%d, shape=%s)" % (self.seq, getattr(self.img, 'shape', None))
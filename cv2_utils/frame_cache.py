@@ -0,0 +1,157 @@
+import os
+import json
+import glob
+import time
+import hashlib
+
+import numpy as np
+
+
+class FrameCache:
+    """
+    Decoded frames of a video stored in a raw file under ~/.cv2_utils/cache, read back as a memory map.
+    The total size of the cache directory is bounded by evicting the least recently used files.
+    """
+    DEFAULT_DIR = os.path.expanduser('~/.cv2_utils/cache')
+    DEFAULT_SIZE_LIMIT = 4 << 30
+    STALE_TMP_AGE = 24 * 3600
+
+    def __init__(self, key, cache_dir=None, size_limit=DEFAULT_SIZE_LIMIT):
+        self.cache_dir = cache_dir or self.DEFAULT_DIR
+        self.size_limit = size_limit
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        self.data_path = os.path.join(self.cache_dir, key + '.frames')
+        self.meta_path = os.path.join(self.cache_dir, key + '.json')
+        self.tmp_path = "%s.%d.tmp" % (self.data_path, os.getpid())
+
+        self.file = None
+        self.shape = None
+        self.dtype = None
+        self.count = 0
+
+    @staticmethod
+    def make_key(file_path, *extra):
+        """
+        key of a video file, changes whenever the file is modified
+        """
+        stat = os.stat(file_path)
+        identity = [os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns] + list(extra)
+        return hashlib.md5(json.dumps(identity).encode()).hexdigest()
+
+    def load(self):
+        """
+        :return: (N, H, W, C) read-only memory map of the cached frames, None if not cached
+        """
+        try:
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            frames = np.memmap(self.data_path, dtype=meta['dtype'], mode='r',
+                               shape=tuple([meta['count']] + meta['shape']))
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(self.data_path)  # mark as recently used
+        return frames
+
+    def evict(self, needed):
+        """
+        remove the least recently used cached videos until needed bytes fit in the size limit
+        """
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*.frames')):
+            if path != self.data_path:
+                try:
+                    entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError:
+                    pass
+        total = sum(entry[1] for entry in entries)
+        for _, size, path in sorted(entries):
+            if total + needed <= self.size_limit:
+                break
+            for file_path in [path, path[:-len('.frames')] + '.json']:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            total -= size
+        return total + needed <= self.size_limit
+
+    @classmethod
+    def is_stale(cls, tmp_path):
+        """
+        whether a temporary file was left by a process that is not running anymore (or a long time ago)
+        """
+        try:
+            if time.time() - os.path.getmtime(tmp_path) > cls.STALE_TMP_AGE:
+                return True
+            pid = int(tmp_path.rsplit('.', 2)[-2])
+        except (OSError, ValueError):
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except OSError:  # e.g. no permission to signal it, the process exists
+            pass
+        return False
+
+    def begin(self, expected_nbytes=0):
+        """
+        start writing frames, return False if the video could not be cached within the size limit
+        """
+        if expected_nbytes > self.size_limit or not self.evict(expected_nbytes):
+            return False
+        for path in glob.glob(self.data_path + '.*.tmp'):
+            if self.is_stale(path):  # interrupted write, other processes may still be writing theirs
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.file = open(self.tmp_path, 'wb')
+        self.shape, self.dtype, self.count = None, None, 0
+        return True
+
+    @property
+    def writing(self):
+        return self.file is not None
+
+    def write(self, frame):
+        if self.shape is None:
+            self.shape, self.dtype = frame.shape, frame.dtype
+        if frame.shape != self.shape or frame.dtype != self.dtype \
+                or (self.count + 1) * frame.nbytes > self.size_limit:
+            self.abort()
+            return
+        self.file.write(np.ascontiguousarray(frame).data)
+        self.count += 1
+
+    def finish(self):
+        """
+        :return: memory map of the written frames, None if nothing was written
+        """
+        self.file.close()
+        self.file = None
+        if self.count == 0:
+            self.remove_tmp()
+            return None
+
+        try:
+            os.replace(self.tmp_path, self.data_path)
+        except OSError:  # the temporary file was removed, leave the video uncached
+            return None
+        with open(self.meta_path, 'w') as f:
+            json.dump({'count': self.count, 'shape': list(self.shape), 'dtype': np.dtype(self.dtype).str}, f)
+        return self.load()
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.remove_tmp()
+
+    def remove_tmp(self):
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
@@ -1,5 +1,26 @@
-from .basic_layer import Layer, ParamLayer, SourceLayer
-from .filter import GaussianFilter
-from .detector import *
-from .thresholding import *
-from .transform import *
+from .basic_layer import Layer, ParamLayer, SourceLayer, SinkLayer
+
+# layer modules are imported when one of their names is first accessed
+import importlib
+
+_LAZY = {
+    'GaussianFilter': '.filter',
+    'HoughCircleDetector': '.detector',
+    'HSVFilter': '.thresholding', 'CompositeHSVFilter': '.thresholding',
+    'RoiSelector': '.transform', 'PolygonMask': '.transform',
+    'AsyncSink': '.sink', 'VideoSink': '.sink', 'ImageSequenceSink': '.sink',
+}
+
+__all__ = ['Layer', 'ParamLayer', 'SourceLayer', 'SinkLayer'] + list(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,11 +1,22 @@
 import os
 import sys
+import asyncio
 import hashlib
+import functools
 import cv2
-from cv2_utils.utils import ConfigLoader
+import numpy as np
+from cv2_utils.utils import ConfigLoader, stack_frames
+from cv2_utils import display
+from cv2_utils.frame import Frame
+
+
+END = object()  # end of a source, StopIteration could not be raised through a Future
 
 
 class Layer:
+    buffer_pool = None
+    tiler = None  # TiledExecutor running the layer on stripes of large images, see halo()
+
     def __init__(self, layer_name='default'):
 
         # TODO automatically generate layer name
@@ -23,27 +34,86 @@ class Layer:
     def inference(self, img, **params):
         return img
 
+    def buffer(self, tag, shape, dtype, zero=False):
+        """
+        output buffer to pass as dst of OpenCV functions, None (allocate a new array) if buffer pool is disabled
+
+        :param zero: the buffer is filled with zeros when allocated, for functions that only write masked pixels
+        """
+        if self.buffer_pool is None:
+            return None
+        return self.buffer_pool.get(tag, shape, dtype, zero)
+
+    async def inference_async(self, img, executor=None, **params):
+        """
+        awaitable inference, run in the executor (the default executor of the event loop if None)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self, img, **params))
+
+    def inference_batch(self, frames, **params):
+        """
+        process a batch of frames, stacked as a (N, H, W, ...) array or as a list of frames
+
+        :return: stacked (N, ...) array if all outputs share the same shape, otherwise a list of outputs
+        """
+        return stack_frames([self(frame, **params) for frame in frames])
+
+    def halo(self, img_shape, **params):
+        """
+        rows above and below a stripe of the image needed to compute the stripe exactly when the layer runs on
+        stripes with a tiler, 0 for pixel-wise layers, None (default) if the layer could not run on stripes
+        """
+        return None
+
+    def tile_output(self, img, **params):
+        """
+        output array whose rows are computed by inference_rows, same shape and type as img by default
+        """
+        dst = self.buffer('tiled', img.shape, img.dtype)
+        return dst if dst is not None else np.empty_like(img)
+
+    def inference_rows(self, img, y0, y1, dst, **params):
+        """
+        compute the rows [y0, y1) of the output of img into dst, called concurrently for the stripes of an image.
+        By default inference runs on the stripe and its halo, it must not write into the buffers of the layer.
+        """
+        halo = self.halo(img.shape, **params)
+        top, bottom = max(y0 - halo, 0), min(y1 + halo, img.shape[0])
+        dst[...] = self.inference(img[top:bottom], **params)[y0 - top:y1 - top]
+
     def __call__(self, *args, **kwargs):
         assert len(args) == 1
+        if isinstance(args[0], Frame):  # the layer processes the image, the envelope passes through
+            return args[0].replace(self(args[0].img, **kwargs))
+        if self.tiler is not None:
+            return self.tiler.run(self, args[0], **kwargs)
         return self.inference(args[0], **kwargs)
 
 
 class ParamLayer(Layer):
     DEFAULT_PARAM = {}
 
-    def __init__(self, layer_name='default', debug=False, **params):
+    def __init__(self, layer_name='default', debug=False, hot_reload=False, **params):
+        """
+
+        :param hot_reload: reload the parameters when the config file is modified by another process
+        """
         super().__init__(layer_name=layer_name)
 
         self.config_loader = ConfigLoader(self.layer_id)
 
         self.param = self.config_loader.load(default_param=self.DEFAULT_PARAM)
         for key, val in params.items():
-            if self.param.get(key):
+            if key in self.param:
                 self.param[key] = val
 
         self.debug = debug
         if self.debug:
-            self.debug_setup()
+            display.call(self.debug_setup)  # on the display thread if any, skipped when headless
+
+        if hot_reload:
+            self.config_loader.watch(self.reload_param)
 
     def debug_setup(self):
         cv2.namedWindow(self.layer_name)
@@ -59,6 +129,16 @@ class ParamLayer(Layer):
     def save_param(self):
         self.config_loader.save(self.param)
 
+    def reload_param(self, param):
+        self.param.update(param)
+        self.param_updated()
+
+    def param_updated(self):
+        """
+        called after the parameters were reloaded, layers caching values derived from them should refresh them
+        """
+        pass
+
 
 class SourceLayer(Layer):
     def __init__(self, layer_name='default'):
@@ -70,5 +150,41 @@ class SourceLayer(Layer):
     def __next__(self):
         raise StopIteration
 
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        frame = await loop.run_in_executor(None, next, self, END)
+        if frame is END:
+            raise StopAsyncIteration
+        return frame
+
     def inference(self, img):
         assert False, "Source layer should not be called"
+
+
+class SinkLayer(Layer):
+    """
+    Layer consuming the frames, e.g. writing them to a file. Frames are passed through unchanged so that
+    a sink could end a Sequential or tap the frames in the middle of it.
+    """
+
+    def __init__(self, layer_name='default'):
+        super().__init__(layer_name=layer_name)
+
+    def write(self, img):
+        pass
+
+    def close(self):
+        pass
+
+    def inference(self, img, **params):
+        self.write(img)
+        return img
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
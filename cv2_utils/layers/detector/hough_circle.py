@@ -7,16 +7,29 @@ from cv2_utils.layers import ParamLayer
 class HoughCircleDetector(ParamLayer):
     DEFAULT_PARAM = {'dist': 10, 'param1': 100, 'param2': 48, 'minRadius': 12, 'maxRadius': 25}
 
-    def __init__(self, layer_name="default", debug=False, **params):
+    def __init__(self, layer_name="default", debug=False, tracking=False, search_margin=10, radius_margin=3,
+                 full_search_interval=30, **params):
         """
 
         :param config_file_name: The config file that would store the configured parameters automatically
         :param debug: show the cv slide bar to adjust parameter if True
+        :param tracking: search small windows around the circles of the previous frame instead of the full frame
+        :param search_margin: pixels added around a previous circle to get its search window
+        :param radius_margin: radius range searched around the radius of a previous circle
+        :param full_search_interval: frames between two full frame searches in tracking mode, a full frame search
+                                     is also done whenever a circle is lost
         :param params: directly indicate parameters for Hough circle detection,
                         default params: {'dist': 10, 'param1': 100, 'param2': 48, 'minRadius': 12, 'maxRadius': 25}
         """
         super().__init__(layer_name, debug, **params)
 
+        self.tracking = tracking
+        self.search_margin = search_margin
+        self.radius_margin = radius_margin
+        self.full_search_interval = full_search_interval
+        self.tracks = np.empty((0, 3), dtype=np.float32)
+        self.frames_since_search = 0
+
     def debug_setup(self):
         super().debug_setup()
         for param, val in self.param.items():
@@ -25,24 +38,66 @@ class HoughCircleDetector(ParamLayer):
     def inference(self, img, **params):
         return self.detect(img, **params)
 
+    @staticmethod
+    def hough(img, merged_params, min_radius, max_radius):
+        circles = cv2.HoughCircles(img, cv2.HOUGH_GRADIENT, 1,
+                                   merged_params('dist'), param1=merged_params('param1'),
+                                   param2=merged_params('param2'), minRadius=min_radius, maxRadius=max_radius)
+        if circles is None:
+            return np.empty((0, 3), dtype=np.float32)
+        return circles[0]
+
+    def track(self, img, merged_params):
+        """
+        search the circles of the previous frame in windows around them
+
+        :return: circles found, None if a circle is lost
+        """
+        height, width = img.shape[:2]
+        found = []
+        for x, y, r in self.tracks:
+            margin = r + self.radius_margin + self.search_margin
+            x0, y0 = max(int(x - margin), 0), max(int(y - margin), 0)
+            x1, y1 = min(int(x + margin) + 1, width), min(int(y + margin) + 1, height)
+            min_radius = max(merged_params('minRadius'), int(r - self.radius_margin))
+            max_radius = min(merged_params('maxRadius'), int(np.ceil(r + self.radius_margin)))
+            candidates = self.hough(img[y0:y1, x0:x1], merged_params, min_radius, max_radius)
+            if len(candidates) == 0:
+                return None
+
+            candidates[:, 0] += x0
+            candidates[:, 1] += y0
+            best = candidates[np.argmin((candidates[:, 0] - x) ** 2 + (candidates[:, 1] - y) ** 2)]
+            # two tracks converging to the same circle
+            if all((best[0] - c[0]) ** 2 + (best[1] - c[1]) ** 2 >= merged_params('dist') ** 2 for c in found):
+                found.append(best)
+        return np.array(found, dtype=np.float32).reshape(-1, 3)
+
     def detect(self, img, **params):
+        """
+        :return: (N, 3) uint16 array of (x, y, radius)
+        """
         if len(img.shape) == 3 and img.shape[-1] == 3:  # color image
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self.buffer('gray', img.shape[:2], img.dtype))
 
         merged_params = params_merger(params, self.param)
 
-        circles = cv2.HoughCircles(img, cv2.HOUGH_GRADIENT, 1,
-                                   merged_params('dist'), param1=merged_params('param1'),
-                                   param2=merged_params('param2'), minRadius=merged_params('minRadius'),
-                                   maxRadius=merged_params('maxRadius'))
+        circles = None
+        if self.tracking and len(self.tracks) > 0 and self.frames_since_search < self.full_search_interval:
+            circles = self.track(img, merged_params)
+            self.frames_since_search += 1
         if circles is None:
-            return []
-        circles = np.uint16(np.around(circles))
-        return circles[0].tolist()
+            circles = self.hough(img, merged_params, merged_params('minRadius'), merged_params('maxRadius'))
+            self.frames_since_search = 0
+        if self.tracking:
+            self.tracks = circles
+
+        return np.uint16(np.around(circles))
 
     def render(self, target, circles, draw_center=True, draw_profile=True):
         for i in circles:
+            center = (int(i[0]), int(i[1]))
             if draw_profile:
-                cv2.circle(target, (i[0], i[1]), i[2], (0, 255, 0), 2)
+                cv2.circle(target, center, int(i[2]), (0, 255, 0), 2)
             if draw_center:
-                cv2.circle(target, (i[0], i[1]), 2, (255, 0, 0), 3)
+                cv2.circle(target, center, 2, (255, 0, 0), 3)
@@ -1,4 +1,5 @@
 import cv2
+import numpy as np
 from cv2_utils.layers import ParamLayer
 from cv2_utils.utils import params_merger
 
@@ -9,11 +10,40 @@ class GaussianFilter(ParamLayer):
     def __init__(self, layer_name="default", debug=False, **params):
         super().__init__(layer_name, debug, **params)
 
+    @staticmethod
+    def _ksize(img_shape, merged_params):
+        ksize_max = min(img_shape[:2])//2
+        return min(merged_params('ksize'), ksize_max - (ksize_max + 1) % 2)
+
     def filter(self, img, **params):
         merged_params = params_merger(params, self.param)
-        ksize_max = min(img.shape[:2])//2
-        ksize = min(merged_params('ksize'), ksize_max - (ksize_max + 1) % 2)
-        return cv2.GaussianBlur(img, (ksize, ksize), merged_params('sigma'))
+        ksize = self._ksize(img.shape, merged_params)
+        return cv2.GaussianBlur(img, (ksize, ksize), merged_params('sigma'),
+                                dst=self.buffer('blur', img.shape, img.dtype))
+
+    def halo(self, img_shape, **params):
+        ksize = self._ksize(img_shape, params_merger(params, self.param))
+        if ksize <= 0:  # kernel size derived from sigma by OpenCV, not tiled
+            return None
+        return ksize // 2
+
+    def inference_rows(self, img, y0, y1, dst, **params):
+        merged_params = params_merger(params, self.param)
+        ksize = self._ksize(img.shape, merged_params)
+        top, bottom = max(y0 - ksize // 2, 0), min(y1 + ksize // 2, img.shape[0])
+        if top == y0 and bottom == y1:
+            cv2.GaussianBlur(img[y0:y1], (ksize, ksize), merged_params('sigma'), dst=dst)
+            return
+        blurred = cv2.GaussianBlur(img[top:bottom], (ksize, ksize), merged_params('sigma'))
+        dst[...] = blurred[y0 - top:y1 - top]
+
+    def filter_batch(self, frames, **params):
+        merged_params = params_merger(params, self.param)
+        ksize = self._ksize(frames.shape[1:], merged_params)
+        dst = np.empty_like(frames)
+        for i in range(len(frames)):  # the kernel must not cross frames, blur each frame into the stacked output
+            cv2.GaussianBlur(frames[i], (ksize, ksize), merged_params('sigma'), dst=dst[i])
+        return dst
 
     def debug_setup(self):
         super().debug_setup()
@@ -29,3 +59,8 @@ class GaussianFilter(ParamLayer):
 
     def inference(self, img, **params):
         return self.filter(img, **params)
+
+    def inference_batch(self, frames, **params):
+        if not isinstance(frames, np.ndarray):
+            return super().inference_batch(frames, **params)
+        return self.filter_batch(frames, **params)
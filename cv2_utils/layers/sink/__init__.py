@@ -0,0 +1,2 @@
+from .async_sink import AsyncSink
+from .video_writer import VideoSink, ImageSequenceSink
@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+
+import numpy as np
+from cv2_utils.layers import SinkLayer
+
+
+class AsyncSink(SinkLayer):
+    """
+    Sink encoding the frames on a background thread behind a bounded queue, so that writing a frame only costs
+    a copy on the live path. Subclasses implement encode(), and release() to close the output.
+    """
+    BLOCK = 'block'
+    DROP = 'drop'
+    SPILL = 'spill'
+
+    def __init__(self, layer_name='default', queue_size=64, full_policy=BLOCK, spill_dir=None, copy=True):
+        """
+
+        :param queue_size: max number of frames waiting in memory to be encoded
+        :param full_policy: what to do when the queue is full, 'block': wait for the encoder,
+                            'drop': drop the new frame, 'spill': save the frame to disk, it is encoded later in order
+        :param spill_dir: directory of the spilled frames, a temporary directory if None
+        :param copy: copy the frames, which is needed if the caller reuses their buffers
+        """
+        super().__init__(layer_name=layer_name)
+        assert queue_size >= 1
+        assert full_policy in [self.BLOCK, self.DROP, self.SPILL], "invalid full policy"
+
+        self.queue_size = queue_size
+        self.full_policy = full_policy
+        self.spill_dir = spill_dir
+        self.copy = copy
+
+        self.queue = deque()  # frames and paths of spilled frames, in order
+        self.in_memory = 0
+        self.cond = threading.Condition()
+        self.error = None
+        self.closed = False
+        self.thread = None
+        self._tmp_dir = None
+
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self.spilled_frames = 0
+
+    def encode(self, img):
+        pass
+
+    def release(self):
+        pass
+
+    def _spill(self, img):
+        if self.spill_dir is None:
+            if self._tmp_dir is None:
+                self._tmp_dir = tempfile.mkdtemp(prefix='cv2_utils_spill_')
+            spill_dir = self._tmp_dir
+        else:
+            spill_dir = self.spill_dir
+            os.makedirs(spill_dir, exist_ok=True)
+        path = os.path.join(spill_dir, "%d_%d.npy" % (id(self), self.spilled_frames))
+        np.save(path, img)
+        self.spilled_frames += 1
+        return path
+
+    def write(self, img):
+        if self.error is not None:
+            raise self.error
+        assert not self.closed, "sink is closed"
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+        with self.cond:
+            if self.in_memory >= self.queue_size:
+                if self.full_policy == self.BLOCK:
+                    while self.in_memory >= self.queue_size and self.error is None:
+                        self.cond.wait()
+                elif self.full_policy == self.DROP:
+                    self.dropped_frames += 1
+                    return
+                else:
+                    self.queue.append(self._spill(img))
+                    self.cond.notify_all()
+                    return
+
+            self.queue.append(img.copy() if self.copy else img)
+            self.in_memory += 1
+            self.cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+                if not self.queue:
+                    return
+                item = self.queue.popleft()
+
+            try:
+                if isinstance(item, str):
+                    img = np.load(item)
+                    os.remove(item)
+                else:
+                    img = item
+                self.encode(img)
+            except Exception as e:
+                with self.cond:
+                    self.error = e
+                    self.queue.clear()
+                    self.cond.notify_all()
+                return
+
+            with self.cond:
+                if not isinstance(item, str):
+                    self.in_memory -= 1
+                self.written_frames += 1
+                self.cond.notify_all()
+
+    @property
+    def pending_frames(self):
+        return len(self.queue)
+
+    def close(self):
+        """
+        encode the remaining frames and close the output
+        """
+        if self.closed:
+            return
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.release()
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,55 @@
+import os
+
+import cv2
+from .async_sink import AsyncSink
+
+
+class VideoSink(AsyncSink):
+    def __init__(self, file_path, fps=30, fourcc='mp4v', layer_name='default', **options):
+        """
+
+        :param file_path: path of the video file, opened when the first frame is written
+        :param fourcc: codec of the video
+        :param options: options of AsyncSink, e.g. queue_size or full_policy
+        """
+        super().__init__(layer_name=layer_name, **options)
+        self.file_path = file_path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+
+    def encode(self, img):
+        if self.writer is None:
+            self.writer = cv2.VideoWriter(self.file_path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps,
+                                          (img.shape[1], img.shape[0]), img.ndim == 3)
+            assert self.writer.isOpened(), "could not open %s" % self.file_path
+        self.writer.write(img)
+
+    def release(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class ImageSequenceSink(AsyncSink):
+    def __init__(self, pattern, start=0, params=None, layer_name='default', **options):
+        """
+
+        :param pattern: path of the images with the index of the frame, e.g. "out/frame_%06d.png"
+        :param start: index of the first frame
+        :param params: encoding parameters of cv2.imwrite, e.g. [cv2.IMWRITE_JPEG_QUALITY, 90]
+        :param options: options of AsyncSink, e.g. queue_size or full_policy
+        """
+        super().__init__(layer_name=layer_name, **options)
+        self.pattern = pattern
+        self.index = start
+        self.params = params or []
+
+        dir_name = os.path.dirname(pattern)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+
+    def encode(self, img):
+        path = self.pattern % self.index
+        assert cv2.imwrite(path, img, self.params), "could not write %s" % path
+        self.index += 1
@@ -1 +1 @@
-from .hsv_filter import HSVFilter
\ No newline at end of file
+from .hsv_filter import HSVFilter, CompositeHSVFilter
\ No newline at end of file
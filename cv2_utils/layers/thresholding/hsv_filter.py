@@ -26,28 +26,115 @@ class HSVFilter(ParamLayer):
     def inference(self, img, **params):
         return self.filter(img, **params)
 
+    def inference_batch(self, frames, **params):
+        if not isinstance(frames, np.ndarray):
+            return super().inference_batch(frames, **params)
+        return self.filter_batch(frames, **params)
+
     def filter(self, image, **params):
-        frame_HSV = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        frame_HSV = cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=self.buffer('hsv', image.shape, image.dtype))
+        return self.threshold(frame_HSV, **params)
 
+    def ranges(self, **params):
+        """
+        :return: list of (low, high) HSV ranges of the filter
+        """
         merged_params = params_merger(params, self.param)
-        frame_threshold = cv2.inRange(frame_HSV, (merged_params('low_H'), merged_params('low_S'), merged_params('low_V')),
-                                      (merged_params('high_H'), merged_params('high_S'), merged_params('high_V')))
-        return frame_threshold
+        return [((merged_params('low_H'), merged_params('low_S'), merged_params('low_V')),
+                 (merged_params('high_H'), merged_params('high_S'), merged_params('high_V')))]
+
+    def threshold(self, frame_HSV, **params):
+        low, high = self.ranges(**params)[0]
+        return cv2.inRange(frame_HSV, low, high, dst=self.buffer('mask', frame_HSV.shape[:2], np.uint8))
+
+    def halo(self, img_shape, **params):
+        return 0
+
+    def tile_output(self, img, **params):
+        dst = self.buffer('mask', img.shape[:2], np.uint8)
+        return dst if dst is not None else np.empty(img.shape[:2], np.uint8)
+
+    def inference_rows(self, img, y0, y1, dst, **params):
+        low, high = self.ranges(**params)[0]
+        cv2.inRange(cv2.cvtColor(img[y0:y1], cv2.COLOR_BGR2HSV), low, high, dst=dst)
+
+    def filter_batch(self, frames, **params):
+        # pixel-wise operations, process the whole (N, H, W, 3) batch as one (N * H, W, 3) image
+        n, h, w = frames.shape[:3]
+        frame_threshold = self.filter(np.ascontiguousarray(frames).reshape(n * h, w, -1), **params)
+        return frame_threshold.reshape(n, h, w)
 
     def __add__(self, other):
         return CompositeHSVFilter(self, other)
 
 
 class CompositeHSVFilter(Layer):
-    def __init__(self, *layers):
+    def __init__(self, *layers, use_lut=False, lut_bits=5):
+        """
+
+        :param layers: HSV filters whose masks are merged
+        :param use_lut: map BGR pixels to the mask with a lookup table over the quantized BGR space instead of
+                        converting to HSV, the table is rebuilt only when the parameters of a filter change
+        :param lut_bits: bits per channel of the quantized BGR space, results are exact with 8 bits (16MB table),
+                         less bits give a smaller and faster table but approximate the range borders
+        """
         self.layers = layers
         assert len(layers) >= 2
+        assert 1 <= lut_bits <= 8
 
-    def inference(self, img, **params):
-        dst = cv2.add(self.layers[0].inference(img), self.layers[1].inference(img))
-        for i in range(2, len(self.layers)):
-            dst = cv2.add(dst, self.layers[i].inference(img))
+        self.use_lut = use_lut
+        self.lut_bits = lut_bits
+        self.lut = None
+        self.lut_ranges = None
+
+    def ranges(self, **params):
+        ranges = []
+        for layer in self.layers:
+            ranges.extend(layer.ranges())
+        return ranges
+
+    def threshold(self, frame_HSV, **params):
+        ranges = self.ranges()
+        dst = cv2.inRange(frame_HSV, *ranges[0], dst=self.buffer('mask', frame_HSV.shape[:2], np.uint8))
+        for low, high in ranges[1:]:
+            mask = cv2.inRange(frame_HSV, low, high, dst=self.buffer('range', frame_HSV.shape[:2], np.uint8))
+            cv2.bitwise_or(dst, mask, dst=dst)
         return dst
 
+    def build_lut(self, ranges):
+        # colour of the center of each quantized BGR cell, indexed by (b << 2 * bits) | (g << bits) | r
+        n = 1 << self.lut_bits
+        step = 256 >> self.lut_bits
+        levels = (np.arange(n, dtype=np.uint16) * step + step // 2).astype(np.uint8)
+        b, g, r = np.meshgrid(levels, levels, levels, indexing='ij')
+        cube = np.stack([b, g, r], axis=-1).reshape(n, n * n, 3)
+
+        self.lut = self.threshold(cv2.cvtColor(cube, cv2.COLOR_BGR2HSV)).reshape(-1).copy()
+        self.lut_ranges = ranges
+
+    def lut_inference(self, img):
+        ranges = self.ranges()
+        if ranges != self.lut_ranges:
+            self.build_lut(ranges)
+
+        bits = self.lut_bits
+        index_type = np.uint16 if bits <= 5 else np.uint32
+        quantized = img >> (8 - bits) if bits < 8 else img
+        index = quantized[..., 0].astype(index_type) << (2 * bits)
+        index |= quantized[..., 1].astype(index_type) << bits
+        index |= quantized[..., 2]
+        return np.take(self.lut, index, out=self.buffer('mask', index.shape, np.uint8))
+
+    def inference(self, img, **params):
+        if self.use_lut:
+            return self.lut_inference(img)
+        return self.threshold(cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=self.buffer('hsv', img.shape, img.dtype)))
+
+    def inference_batch(self, frames, **params):
+        if not isinstance(frames, np.ndarray):
+            return super().inference_batch(frames, **params)
+        n, h, w = frames.shape[:3]
+        return self.inference(np.ascontiguousarray(frames).reshape(n * h, w, -1)).reshape(n, h, w)
+
     def __add__(self, other):
-        return CompositeHSVFilter(*self.layers, other)
+        return CompositeHSVFilter(*self.layers, other, use_lut=self.use_lut, lut_bits=self.lut_bits)
@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 from cv2_utils.layers import ParamLayer
+from cv2_utils import display
 
 
 class PolygonMask(ParamLayer):
@@ -30,6 +31,15 @@ class PolygonMask(ParamLayer):
     def inference(self, img, **params):
         return self.masking(img, **params)
 
+    def inference_batch(self, frames, **params):
+        if not isinstance(frames, np.ndarray):
+            return super().inference_batch(frames, **params)
+        return self.masking_batch(frames, **params)
+
+    def param_updated(self):
+        self.contour = self.param['contour']
+        self.contour_changed = True
+
     def update_mask(self, img_shape):
         if len(self.contour) < 3:
             return None
@@ -37,11 +47,73 @@ class PolygonMask(ParamLayer):
         cv2.drawContours(mask, [np.array(self.contour)], -1, (255), -1)
         return mask
 
+    def update_clip(self, img_shape):
+        """
+        bounding rect of the contour inside the image and the mask cropped to it
+        """
+        if len(self.contour) < 3:
+            return None, None
+        contour = np.array(self.contour)
+        x, y, w, h = cv2.boundingRect(contour)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, img_shape[0]), min(y + h, img_shape[1])
+        if x1 <= x0 or y1 <= y0:
+            return (0, 0, 0, 0), np.zeros((0, 0), dtype='uint8')
+
+        mask = np.zeros((y1 - y0, x1 - x0), dtype='uint8')
+        cv2.drawContours(mask, [contour - (x0, y0)], -1, (255), -1)
+        return (x0, y0, x1 - x0, y1 - y0), mask
+
+    def refresh(self, img_shape):
+        """
+        rebuild the masks if the contour or the image size changed
+
+        :param img_shape: [width, height] of the image
+        """
+        if self.last_img_shape[0] == img_shape[0] and self.last_img_shape[1] == img_shape[1] \
+                and not self.contour_changed:
+            return
+        self.last_img_shape = img_shape
+        self.contour_changed = False
+        if self.buffer_pool is not None:  # pixels outside of the new mask have to be zeroed again
+            self.buffer_pool.clear()
+
+        # the full size mask is only needed when the masked image is not clipped
+        self.mask = self.update_mask(img_shape) if not self.auto_clip or self.debug else None
+        self.clip_rect, self.clip_mask = self.update_clip(img_shape) if self.auto_clip else (None, None)
+
+    def halo(self, img_shape, **params):
+        if self.debug:
+            return None
+        self.refresh([img_shape[1], img_shape[0]])
+        if (self.clip_mask if self.auto_clip else self.mask) is None:
+            return None
+        return 0
+
+    def tile_output(self, img, **params):
+        if self.auto_clip:
+            x, y, w, h = self.clip_rect
+            shape = (h, w) + img.shape[2:]
+        else:
+            shape = img.shape
+        dst = self.buffer('masked', shape, img.dtype, zero=True)
+        return dst if dst is not None else np.zeros(shape, img.dtype)
+
+    def inference_rows(self, img, y0, y1, dst, **params):
+        if self.auto_clip:
+            x, y, w, h = self.clip_rect
+            roi, mask = img[y + y0:y + y1, x:x + w], self.clip_mask[y0:y1]
+        else:
+            roi, mask = img[y0:y1], self.mask[y0:y1]
+        cv2.bitwise_and(roi, roi, mask=mask, dst=dst)
+
     def mouse_click(self, event, x, y, flags, param):
         if event == cv2.EVENT_LBUTTONDOWN:
             self.contour.append(((x, y),))
         elif event == cv2.EVENT_RBUTTONDOWN:
             self.contour.clear()
+        else:
+            return
 
         self.contour_changed = True
         self.config_loader.save({'contour': self.contour})
@@ -53,25 +125,49 @@ class PolygonMask(ParamLayer):
             contour = self.contour
 
         if self.debug and (params.get('show') is None or params.get('show')):
-            image = img.copy()
-            for i in range(len(contour)):
-                cv2.line(image, (contour[i][0][0], contour[i][0][1]),
-                         (contour[(i + 1) % len(contour)][0][0], contour[(i + 1) % len(contour)][0][1]), (0, 0, 255), 2)
+            display.show(self.layer_name, img, lambda frame: self.draw_contour(frame, contour), wait=True)
 
-            cv2.imshow(self.layer_name, image)
-            cv2.waitKey(1)
+        self.refresh([img.shape[1], img.shape[0]])
 
-        if self.last_img_shape[0] != img.shape[1] or self.last_img_shape[1] != img.shape[0] or self.contour_changed:
-            img_shape = [img.shape[1], img.shape[0]]
-            self.mask = self.update_mask(img_shape)
-            self.last_img_shape = img_shape
-            self.contour_changed = False
+        if self.auto_clip and (not self.debug):
+            if self.clip_mask is None:
+                return img
+            # crop first, then mask only the region of the polygon
+            x, y, w, h = self.clip_rect
+            if w == 0 or h == 0:  # polygon outside of the image, OpenCV returns None for an empty image
+                return img[0:0, 0:0]
+            roi = img[y:y + h, x:x + w]
+            return cv2.bitwise_and(roi, roi, mask=self.clip_mask,
+                                   dst=self.buffer('masked', roi.shape, roi.dtype, zero=True))
 
         if self.mask is None:
             return img
+        return cv2.bitwise_and(img, img, mask=self.mask, dst=self.buffer('masked', img.shape, img.dtype, zero=True))
+
+    @staticmethod
+    def draw_contour(img, contour):
+        image = img.copy()
+        for i in range(len(contour)):
+            cv2.line(image, (contour[i][0][0], contour[i][0][1]),
+                     (contour[(i + 1) % len(contour)][0][0], contour[(i + 1) % len(contour)][0][1]), (0, 0, 255), 2)
+        return image
+
+    def masking_batch(self, frames, **params):
+        self.refresh([frames.shape[2], frames.shape[1]])
 
-        masked_img = cv2.bitwise_and(img, img, mask=self.mask)
         if self.auto_clip and (not self.debug):
-            rect = cv2.boundingRect(np.array(self.contour))
-            masked_img = masked_img[rect[1]:rect[1] + rect[3], rect[0]:rect[0] + rect[2], :]
-        return masked_img
+            if self.clip_mask is None:
+                return frames
+            x, y, w, h = self.clip_rect
+            frames = frames[:, y:y + h, x:x + w]
+            mask = self.clip_mask
+        else:
+            if self.mask is None:
+                return frames
+            mask = self.mask
+
+        # broadcast the mask over the batch and the channels
+        mask = (mask > 0).reshape((1,) + mask.shape + (1,) * (frames.ndim - 3))
+        masked = np.zeros(frames.shape, dtype=frames.dtype)
+        np.copyto(masked, frames, where=mask)
+        return masked
@@ -1,10 +1,14 @@
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 from cv2_utils.layers import ParamLayer
+from cv2_utils import display
 
 
 class RoiSelector(ParamLayer):
     WINDOW_NAME = 'roi'
+    ROI_CACHE_SIZE = 8
 
     def __init__(self, width, height, layer_name="default", debug=False, **params):
         """
@@ -28,7 +32,49 @@ class RoiSelector(ParamLayer):
 
         self.roi = np.float32(self.param['roi'])
         self.n_point = 0
+        self.roi_cache = OrderedDict()  # per-call roi -> (M, remap tables)
+        self.transform_version = 0
+        self.maps = None  # (transform version, image shape, remap tables)
+        self.update_transform()
+
+    def update_transform(self):
+        """
+        could be called from the config sync or the display thread while frames are processed,
+        M is set before the version so that maps built from a stale M are never kept
+        """
         self.M = cv2.getPerspectiveTransform(self.roi, self.pts_d)
+        self.transform_version += 1
+
+    def param_updated(self):
+        self.roi = np.float32(self.param['roi'])
+        self.update_transform()
+
+    def build_maps(self, M):
+        """
+        fixed-point remap tables of the perspective transform, equivalent to warpPerspective(img, M)
+        """
+        M_inv = np.linalg.inv(np.float64(M))
+        xs, ys = np.meshgrid(np.arange(self.width, dtype=np.float64), np.arange(self.height, dtype=np.float64))
+        den = M_inv[2, 0] * xs + M_inv[2, 1] * ys + M_inv[2, 2]
+        map_x = ((M_inv[0, 0] * xs + M_inv[0, 1] * ys + M_inv[0, 2]) / den).astype(np.float32)
+        map_y = ((M_inv[1, 0] * xs + M_inv[1, 1] * ys + M_inv[1, 2]) / den).astype(np.float32)
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+    def get_maps(self, img_shape, roi=None):
+        if roi is None:
+            version = self.transform_version
+            if self.maps is None or self.maps[0] != version or self.maps[1] != img_shape[:2]:
+                self.maps = (version, img_shape[:2], self.build_maps(self.M))
+            return self.maps[2]
+
+        key = tuple(np.float32(roi).ravel().tolist())
+        if key in self.roi_cache:
+            self.roi_cache.move_to_end(key)
+        else:
+            self.roi_cache[key] = self.build_maps(cv2.getPerspectiveTransform(np.float32(roi), self.pts_d))
+            if len(self.roi_cache) > self.ROI_CACHE_SIZE:
+                self.roi_cache.popitem(last=False)
+        return self.roi_cache[key]
 
     def debug_setup(self):
         super().debug_setup()
@@ -37,6 +83,11 @@ class RoiSelector(ParamLayer):
     def inference(self, img, **params):
         return self.wrap(img, **params)
 
+    def inference_batch(self, frames, **params):
+        if not isinstance(frames, np.ndarray):
+            return super().inference_batch(frames, **params)
+        return self.wrap_batch(frames, **params)
+
     def mouse_click(self, event, x, y, flags, param):
         if event == cv2.EVENT_LBUTTONDOWN:
             self.roi[self.n_point][0] = x
@@ -44,22 +95,29 @@ class RoiSelector(ParamLayer):
             self.n_point += 1
             if self.n_point >= 4:
                 self.n_point = 0
-                self.M = cv2.getPerspectiveTransform(self.roi, self.pts_d)
+                self.update_transform()
                 self.config_loader.save({'roi': self.roi.tolist()})
 
     def wrap(self, img, **params):
-        if params.get('roi'):
-            M = cv2.getPerspectiveTransform(params.get('roi'), self.pts_d)
-        else:
-            M = self.M
+        map1, map2 = self.get_maps(img.shape, params.get('roi'))
 
         if self.debug:
-            image = img.copy()
-            for i in [0,3]:
-                for j in [1,2]:
-                    cv2.line(image, (self.roi[i][0],self.roi[i][1]), (self.roi[j][0],self.roi[j][1]), (0,0,255), 2)
+            display.show(self.layer_name, img, self.draw_roi, wait=True)
+
+        return cv2.remap(img, map1, map2, cv2.INTER_LINEAR,
+                         dst=self.buffer('wrap', (self.height, self.width) + img.shape[2:], img.dtype))
+
+    def draw_roi(self, img):
+        image = img.copy()
+        for i in [0,3]:
+            for j in [1,2]:
+                cv2.line(image, (self.roi[i][0],self.roi[i][1]), (self.roi[j][0],self.roi[j][1]), (0,0,255), 2)
+        return image
 
-            cv2.imshow(self.layer_name, image)
-            cv2.waitKey(1)
+    def wrap_batch(self, frames, **params):
+        map1, map2 = self.get_maps(frames.shape[1:], params.get('roi'))
 
-        return cv2.warpPerspective(img, M, (self.width, self.height))
+        dst = np.empty((len(frames), self.height, self.width) + frames.shape[3:], dtype=frames.dtype)
+        for i in range(len(frames)):
+            cv2.remap(frames[i], map1, map2, cv2.INTER_LINEAR, dst=dst[i])
+        return dst
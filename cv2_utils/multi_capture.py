@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from cv2_utils.layers import SourceLayer
+from cv2_utils.video_capture import Generator
+
+
+class FrameSet:
+    """
+    Frames of several sources grabbed together, with the time each frame was grabbed (time.monotonic).
+    The frame and the timestamp of a missing source are None.
+    """
+    __slots__ = ('frames', 'timestamps')
+
+    def __init__(self, frames, timestamps):
+        self.frames = frames
+        self.timestamps = timestamps
+
+    @property
+    def timestamp(self):
+        valid = [t for t in self.timestamps if t is not None]
+        return sum(valid) / len(valid) if valid else None
+
+    @property
+    def skew(self):
+        """
+        time between the first and the last grab of the set
+        """
+        valid = [t for t in self.timestamps if t is not None]
+        return max(valid) - min(valid) if valid else 0.
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, item):
+        return self.frames[item]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+
+class MultiCapture(SourceLayer):
+    STOP = 'stop'
+    SKIP = 'skip'
+    REPEAT = 'repeat'
+
+    def __init__(self, sources, layer_name="default", loop=False, on_missing=STOP, timeout=None):
+        """
+        Grab all sources back to back for a tight temporal alignment, then decode the frames in parallel.
+
+        :param sources: file paths / devices / topics accepted by VideoCapture, or Generator objects
+        :param on_missing: what to do when a source ended or was too slow, 'stop': end the iteration,
+                           'skip': None in place of its frame, 'repeat': the last frame of that source
+        :param timeout: max seconds to wait for the frames to be decoded, a slow source is skipped
+                        until its pending frame is decoded, wait for all sources if None
+        """
+        super().__init__(layer_name=layer_name)
+        assert on_missing in [self.STOP, self.SKIP, self.REPEAT], "invalid missing source policy"
+
+        self.gens = [source if isinstance(source, Generator) else Generator.get_generator(source, loop)
+                     for source in sources]
+        assert len(self.gens) > 0
+        self.on_missing = on_missing
+        self.timeout = timeout
+
+        self.executor = ThreadPoolExecutor(max_workers=len(self.gens))
+        self.pending = [None] * len(self.gens)  # decoding still running from a previous set
+        self.last_frames = [None] * len(self.gens)
+        self.last_timestamps = [None] * len(self.gens)
+        self.missing_frames = [0] * len(self.gens)
+
+    def __next__(self):
+        n = len(self.gens)
+        timestamps = [None] * n
+        futures = [None] * n
+        ended = 0
+
+        for i, gen in enumerate(self.gens):
+            if self.pending[i] is not None:
+                if not self.pending[i].done():
+                    continue
+                self.pending[i] = None  # stale frame of a previous set
+            if gen.grab():
+                timestamps[i] = time.monotonic()
+            else:
+                ended += 1
+        if ended == n:
+            raise StopIteration
+        for i, gen in enumerate(self.gens):
+            if timestamps[i] is not None:
+                futures[i] = self.executor.submit(gen.retrieve)
+        wait([future for future in futures if future is not None], timeout=self.timeout)
+
+        frames = [None] * n
+        for i in range(n):
+            ret = False
+            if futures[i] is not None:
+                if futures[i].done():
+                    ret, frames[i] = futures[i].result()
+                else:
+                    self.pending[i] = futures[i]
+
+            if ret:
+                self.last_frames[i], self.last_timestamps[i] = frames[i], timestamps[i]
+                continue
+
+            self.missing_frames[i] += 1
+            if self.on_missing == self.STOP:
+                raise StopIteration
+            if self.on_missing == self.REPEAT:
+                frames[i], timestamps[i] = self.last_frames[i], self.last_timestamps[i]
+            else:
+                timestamps[i] = None
+
+        return FrameSet(frames, timestamps)
+
+    def release(self):
+        self.executor.shutdown(wait=False)
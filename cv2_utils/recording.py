@@ -0,0 +1,135 @@
+import os
+import json
+import time
+
+import numpy as np
+
+
+class Recording:
+    """
+    Raw frames and capture timestamps written by a Recorder. A recording is a directory (e.g. "run.rec") of chunks,
+    each chunk holds frames of the same shape in a raw file and their timestamps as float64 in another one,
+    so that frames are read back as memory maps without decoding.
+    """
+    META = 'meta.json'
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, self.META), 'r') as f:
+            self.chunks = json.load(f)['chunks']
+        self.count = sum(chunk['count'] for chunk in self.chunks)
+
+    @classmethod
+    def is_recording(cls, path):
+        return isinstance(path, str) and os.path.isfile(os.path.join(path, cls.META))
+
+    def load_chunk(self, i):
+        """
+        :return: (N, H, W, C) read-only memory map of the frames of chunk i and their timestamps
+        """
+        chunk = self.chunks[i]
+        base = os.path.join(self.path, chunk['name'])
+        frames = np.memmap(base + '.frames', dtype=chunk['dtype'], mode='r',
+                           shape=tuple([chunk['count']] + chunk['shape']))
+        timestamps = np.fromfile(base + '.ts', dtype=np.float64, count=chunk['count'])
+        return frames, timestamps
+
+
+class Recorder:
+    """
+    Record raw frames and their capture timestamps from any generator into a Recording, to be replayed
+    deterministically by VideoCapture.
+    """
+
+    def __init__(self, path, chunk_frames=256):
+        """
+
+        :param path: directory of the recording, created if needed, e.g. "run.rec"
+        :param chunk_frames: max number of frames in a chunk file
+        """
+        self.path = path
+        self.chunk_frames = chunk_frames
+        os.makedirs(path, exist_ok=True)
+
+        self.chunks = []
+        self.frame_file = None
+        self.ts_file = None
+        self.shape = None
+        self.dtype = None
+        self.count = 0
+
+    def _open_chunk(self, frame):
+        base = os.path.join(self.path, 'chunk_%06d' % len(self.chunks))
+        self.frame_file = open(base + '.frames', 'wb')
+        self.ts_file = open(base + '.ts', 'wb')
+        self.shape, self.dtype, self.count = frame.shape, frame.dtype, 0
+
+    def _close_chunk(self):
+        if self.frame_file is None:
+            return
+        self.frame_file.close()
+        self.ts_file.close()
+        self.frame_file = None
+        self.chunks.append({'name': 'chunk_%06d' % len(self.chunks), 'count': self.count,
+                            'shape': list(self.shape), 'dtype': np.dtype(self.dtype).str})
+        self.write_meta()
+
+    def write_meta(self):
+        # written after each chunk, so the closed chunks stay readable if the recording is interrupted
+        meta_path = os.path.join(self.path, Recording.META)
+        tmp_path = "%s.%d.tmp" % (meta_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump({'chunks': self.chunks}, f)
+        os.replace(tmp_path, meta_path)
+
+    def write(self, frame, timestamp=None):
+        """
+        :param timestamp: capture time of the frame in seconds, the current time if None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if self.frame_file is not None and (frame.shape != self.shape or frame.dtype != self.dtype
+                                            or self.count >= self.chunk_frames):
+            self._close_chunk()
+        if self.frame_file is None:
+            self._open_chunk(frame)
+
+        self.frame_file.write(np.ascontiguousarray(frame).data)
+        self.ts_file.write(np.float64(timestamp).tobytes())
+        self.count += 1
+
+    def record(self, source, max_frames=None, duration=None, **options):
+        """
+        record the frames of a generator, timestamped when they are grabbed
+
+        :param source: Generator, or source of Generator.get_generator such as a camera index or a ROS topic
+        :param max_frames: stop after this number of frames
+        :param duration: stop after this number of seconds
+        :return: number of recorded frames
+        """
+        from cv2_utils.video_capture import Generator
+        gen = source if isinstance(source, Generator) else Generator.get_generator(source, False, **options)
+
+        n = 0
+        end_time = time.monotonic() + duration if duration is not None else None
+        while (max_frames is None or n < max_frames) and (end_time is None or time.monotonic() < end_time):
+            if not gen.grab():
+                break
+            timestamp = time.time()
+            ret, frame = gen.retrieve()
+            if not ret:
+                break
+            self.write(frame, timestamp)
+            n += 1
+        return n
+
+    def close(self):
+        self._close_chunk()
+        if not self.chunks:
+            self.write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,104 @@
+"""
+Decoding of sensor_msgs/Image and sensor_msgs/CompressedImage messages to OpenCV images.
+Only the message fields are used, so any object with the same attributes could be decoded without ROS.
+"""
+import re
+
+import cv2
+import numpy as np
+
+# encoding -> (dtype, channels, cvtColor code to BGR(A) or None if already in OpenCV order)
+ENCODINGS = {
+    'bgr8': (np.uint8, 3, None),
+    'bgra8': (np.uint8, 4, None),
+    'bgr16': (np.uint16, 3, None),
+    'bgra16': (np.uint16, 4, None),
+    'rgb8': (np.uint8, 3, cv2.COLOR_RGB2BGR),
+    'rgba8': (np.uint8, 4, cv2.COLOR_RGBA2BGRA),
+    'rgb16': (np.uint16, 3, cv2.COLOR_RGB2BGR),
+    'rgba16': (np.uint16, 4, cv2.COLOR_RGBA2BGRA),
+    'mono8': (np.uint8, 1, None),
+    'mono16': (np.uint16, 1, None),
+    # the bayer pattern names of OpenCV start one pixel later than the ROS ones
+    'bayer_rggb8': (np.uint8, 1, cv2.COLOR_BayerBG2BGR),
+    'bayer_bggr8': (np.uint8, 1, cv2.COLOR_BayerRG2BGR),
+    'bayer_gbrg8': (np.uint8, 1, cv2.COLOR_BayerGR2BGR),
+    'bayer_grbg8': (np.uint8, 1, cv2.COLOR_BayerGB2BGR),
+    'bayer_rggb16': (np.uint16, 1, cv2.COLOR_BayerBG2BGR),
+    'bayer_bggr16': (np.uint16, 1, cv2.COLOR_BayerRG2BGR),
+    'bayer_gbrg16': (np.uint16, 1, cv2.COLOR_BayerGR2BGR),
+    'bayer_grbg16': (np.uint16, 1, cv2.COLOR_BayerGB2BGR),
+    'yuv422': (np.uint8, 2, cv2.COLOR_YUV2BGR_UYVY),
+    'uyvy': (np.uint8, 2, cv2.COLOR_YUV2BGR_UYVY),
+    'yuv422_yuy2': (np.uint8, 2, cv2.COLOR_YUV2BGR_YUY2),
+    'yuyv': (np.uint8, 2, cv2.COLOR_YUV2BGR_YUY2),
+}
+
+# generic OpenCV types such as 8UC3, 16SC1, 32FC1, 64FC1
+CV_TYPE = re.compile(r'^(8|16|32|64)(U|S|F)C(\d+)$')
+CV_DEPTHS = {('8', 'U'): np.uint8, ('8', 'S'): np.int8, ('16', 'U'): np.uint16, ('16', 'S'): np.int16,
+             ('32', 'S'): np.int32, ('32', 'F'): np.float32, ('64', 'F'): np.float64}
+
+
+def parse_encoding(encoding):
+    """
+    :return: (dtype, channels, cvtColor code or None) of a sensor_msgs/Image encoding
+    """
+    if encoding in ENCODINGS:
+        return ENCODINGS[encoding]
+    match = CV_TYPE.match(encoding.upper())
+    assert match is not None and (match.group(1), match.group(2)) in CV_DEPTHS, \
+        "unsupported encoding type %s" % encoding
+    return CV_DEPTHS[(match.group(1), match.group(2))], int(match.group(3)), None
+
+
+def decode_image(msg):
+    """
+    decode a sensor_msgs/Image, the row padding (step) and the byte order (is_bigendian) are handled
+    with strided views, so the image is not copied unless it has to be converted
+
+    :return: (height, width) image for single channel encodings, (height, width, channels) otherwise,
+             a read-only view of msg.data if no conversion is needed
+    """
+    dtype, channels, code = parse_encoding(msg.encoding)
+    dtype = np.dtype(dtype).newbyteorder('>' if msg.is_bigendian else '<')
+    row_bytes = msg.width * channels * dtype.itemsize
+    assert msg.step >= row_bytes and len(msg.data) >= (msg.height - 1) * msg.step + row_bytes, "truncated image"
+
+    data = np.frombuffer(msg.data, dtype=np.uint8)
+    rows = np.lib.stride_tricks.as_strided(data, shape=(msg.height, row_bytes), strides=(msg.step, 1),
+                                           writeable=False)
+    image = rows.view(dtype).reshape(msg.height, msg.width, channels)
+    if channels == 1:
+        image = image[..., 0]
+
+    if not dtype.isnative:
+        image = image.astype(dtype.newbyteorder('='))
+    if code is not None:
+        image = cv2.cvtColor(image, code)
+    return image
+
+
+def decode_compressed_image(msg):
+    """
+    decode a sensor_msgs/CompressedImage (jpeg, png, or compressedDepth png of image_transport),
+    32FC1 compressedDepth images are dequantized to float32 depth with NaN for invalid pixels
+    """
+    data = np.frombuffer(msg.data, dtype=np.uint8)
+    if 'compressedDepth' not in msg.format:
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        assert image is not None, "could not decode %s image" % msg.format
+        return image
+
+    # config header of compressed_depth_image_transport: int32 format, float32 depthQuantA, depthQuantB
+    quant_a, quant_b = np.frombuffer(msg.data, dtype='<f4', count=2, offset=4)
+    image = cv2.imdecode(data[12:], cv2.IMREAD_UNCHANGED)
+    assert image is not None, "could not decode %s image" % msg.format
+    if msg.format.split(';')[0].strip() != '32FC1':
+        return image  # 16UC1 depth is stored as is
+
+    # 32FC1 depth is stored as quantized inverse depth, 0 is an invalid pixel
+    depth = np.full(image.shape, np.nan, dtype=np.float32)
+    valid = image != 0
+    depth[valid] = quant_a / (image[valid].astype(np.float32) - quant_b)
+    return depth
@@ -1,35 +1,275 @@
-from .layers import Layer, SourceLayer
+import time
+import asyncio
+
+import numpy as np
+
+from .layers import Layer, SourceLayer, SinkLayer
+from .layers.basic_layer import END
+from .utils import stack_frames, BufferPool
+from .stats import PipelineStats
+from .tiling import TiledExecutor
+from .frame import Frame
 
 
 class Sequential(Layer):
-    def __init__(self, layers=[]):
+    def __init__(self, layers=[], backend=None, profile=False, reuse_buffers=False, borrow_output=False):
+        """
+
+        :param layers: layers of the model, the first one could be a source layer
+        :param backend: execution backend used when iterating the model, such as ThreadBackend,
+                        layers run one after another on the calling thread if None
+        :param profile: record per layer timing statistics, see stats()
+        :param reuse_buffers: layers write their outputs into preallocated buffers instead of allocating new arrays
+        :param borrow_output: with reuse_buffers, return the buffer of the last layer, which is only valid until
+                              the next frame, instead of a copy of it
+        """
         Layer.__init__(self)
 
         self._layers = []
+        self._layer_keys = {}
+        self.backend = backend
+        self._backend_started = False
+        self.profiler = PipelineStats() if profile else None
+        self.reuse_buffers = False
+        self.borrow_output = borrow_output
+        self.executor = None  # executor of the layers when used with async for, default one of the loop if None
+        self.last_seq = -1  # sequence number of the last returned Frame
 
         for layer in layers:
             self.add(layer)
 
+        if reuse_buffers:
+            self.enable_buffer_pool(borrow_output)
+
     @property
     def layers(self):
         if len(self._layers) > 0 and isinstance(self._layers[0], SourceLayer):
             return self._layers[1:]
         return self._layers
 
+    def set_backend(self, backend):
+        self.stop()
+        self.backend = backend
+
     def __iter__(self):
         assert len(self._layers) > 0 and isinstance(self._layers[0], SourceLayer)
+        if self.backend is not None:
+            self.backend.start(self)
+            self._backend_started = True
         return self
 
     def __next__(self):
+        try:
+            img = self._next()
+        except StopIteration:
+            self.close_sinks()
+            raise
+        if isinstance(img, Frame):
+            self.track(img)
+        return img
+
+    def _next(self):
+        if self.backend is not None:
+            if not self._backend_started:
+                self.__iter__()
+            return self.backend.next()
+
+        if self.profiler is None:
+            return self.inference(next(self._layers[0]))
+
+        start = time.perf_counter()
+        img = self.inference(self.read_source())
+        self.profiler.record('frame', time.perf_counter() - start)
+        return img
+
+    def __aiter__(self):
+        assert len(self._layers) > 0 and isinstance(self._layers[0], SourceLayer)
+        return self
+
+    async def __anext__(self):
+        if self.backend is not None:
+            if not self._backend_started:
+                self.__iter__()
+            loop = asyncio.get_running_loop()
+            img = await loop.run_in_executor(self.executor, next, self, END)
+            if img is END:
+                raise StopAsyncIteration
+            return img
+
+        start = time.perf_counter()
+        try:
+            frame = await self._layers[0].__anext__()
+        except StopAsyncIteration:
+            self.close_sinks()
+            raise
+        if self.profiler is not None:
+            self.profiler.record('source', time.perf_counter() - start)
+            self.profiler.count('frames')
+
+        img = await self.inference_async(frame, self.executor)
+        if self.profiler is not None:
+            self.profiler.record('frame', time.perf_counter() - start)
+        if isinstance(img, Frame):
+            self.track(img)
+        return img
+
+    def track(self, frame):
+        """
+        flag the gap in the sequence numbers before a returned Frame, and record its latency from the capture
+        ('latency') and from the entry in the pipeline ('processing') when stats are enabled
+        """
+        frame.gap = frame.seq - self.last_seq - 1
+        self.last_seq = frame.seq
+        if self.profiler is not None:
+            now = time.monotonic()
+            self.profiler.record('latency', now - frame.capture_time)
+            self.profiler.record('processing', now - frame.ingest_time)
+            if frame.gap > 0:
+                self.profiler.count('seq_gaps')
+                self.profiler.count('lost_frames', frame.gap)
+
+    def read_source(self):
+        if self.profiler is None:
+            return next(self._layers[0])
+
+        start = time.perf_counter()
         frame = next(self._layers[0])
-        return self.inference(frame)
+        self.profiler.record('source', time.perf_counter() - start)
+        self.profiler.count('frames')
+        return frame
+
+    def stop(self):
+        if self.backend is not None and self._backend_started:
+            self.backend.stop()
+        self._backend_started = False
+
+    def close_sinks(self):
+        """
+        flush and close the sink layers, called when the source ends
+        """
+        for layer in self.layers:
+            if isinstance(layer, SinkLayer):
+                layer.close()
 
     def add(self, layer):
         assert isinstance(layer, Layer)
 
+        self._layer_keys[id(layer)] = "%d_%s" % (len(self._layers), layer.__class__.__name__)
         self._layers.append(layer)
+        if self.reuse_buffers:
+            layer.buffer_pool = BufferPool()
 
-    def inference(self, img):
+    def enable_buffer_pool(self, borrow_output=False):
+        """
+        reuse per layer output buffers, see reuse_buffers and borrow_output of __init__
+        """
+        self.reuse_buffers = True
+        self.borrow_output = borrow_output
         for layer in self.layers:
-            img = layer.inference(img)
+            layer.buffer_pool = BufferPool()
+
+    def disable_buffer_pool(self):
+        self.reuse_buffers = False
+        for layer in self.layers:
+            layer.buffer_pool = None
+
+    def enable_tiling(self, tiler=None):
+        """
+        run the layers supporting it on stripes of the frames in a thread pool, see TiledExecutor
+
+        :param tiler: TiledExecutor shared by the layers, a default one if None
+        """
+        tiler = tiler or TiledExecutor()
+        for layer in self.layers:
+            layer.tiler = tiler
+
+    def disable_tiling(self):
+        for layer in self.layers:
+            layer.tiler = None
+
+    def enable_stats(self, window=1000):
+        """
+        :param window: number of latest samples kept for the percentiles
+        """
+        self.profiler = PipelineStats(window)
+
+    def disable_stats(self):
+        self.profiler = None
+
+    def stats(self):
+        """
+        :return: p50/p95/p99 of the source read time, per layer time and whole frame time in ms, and frame counters,
+                 including the frames processed and shed by a source in deadline mode
+        """
+        if self.profiler is None:
+            return {}
+        summary = self.profiler.summary()
+        source = self._layers[0] if self._layers else None
+        if getattr(source, 'deadline', False):
+            summary['counters'].update({'processed': source.processed_frames, 'shed': source.shed_frames})
+        return summary
+
+    def dump_stats(self, path):
+        assert self.profiler is not None, "stats are not enabled"
+        self.profiler.dump(path)
+
+    def run_layers(self, img, layers):
+        if self.profiler is None:
+            for layer in layers:
+                img = layer(img)
+            return img
+
+        for layer in layers:
+            start = time.perf_counter()
+            img = layer(img)
+            self.profiler.record(self._layer_keys[id(layer)], time.perf_counter() - start)
+        return img
+
+    def inference(self, img):
+        if isinstance(img, Frame):
+            return img.replace(self.inference(img.img))
+        img = self.run_layers(img, self.layers)
+        if self.reuse_buffers and not self.borrow_output and isinstance(img, np.ndarray):
+            img = img.copy()
         return img
+
+    def inference_batch(self, frames):
+        for layer in self.layers:
+            frames = layer.inference_batch(frames)
+        if self.reuse_buffers and not self.borrow_output:
+            if isinstance(frames, np.ndarray):
+                frames = frames.copy()
+            else:
+                frames = [frame.copy() if isinstance(frame, np.ndarray) else frame for frame in frames]
+        return frames
+
+    def run_batch(self, source=None, batch_size=32):
+        """
+        pull frames from the source in chunks and process them batch by batch
+
+        :param source: iterable of frames, the source layer of the model if None
+        :param batch_size: number of frames in a batch
+        :return: generator of processed batches, lists of envelopes if the source returns Frame envelopes
+        """
+        if source is None:
+            assert len(self._layers) > 0 and isinstance(self._layers[0], SourceLayer)
+            source = self._layers[0]
+
+        batch = []
+        for frame in source:
+            batch.append(frame)
+            if len(batch) == batch_size:
+                yield self.process_batch(batch)
+                batch = []
+        if len(batch) > 0:
+            yield self.process_batch(batch)
+
+    def process_batch(self, batch):
+        if not isinstance(batch[0], Frame):
+            return self.inference_batch(stack_frames(batch))
+
+        outputs = self.inference_batch(stack_frames([frame.img for frame in batch]))
+        frames = [frame.replace(output) for frame, output in zip(batch, outputs)]
+        for frame in frames:
+            self.track(frame)
+        return frames
@@ -0,0 +1,59 @@
+import json
+from collections import deque
+
+import numpy as np
+
+
+class RollingHistogram:
+    """
+    Keep the latest samples of a value and summarize them with percentiles.
+    """
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+    def summary(self, scale=1.):
+        summary = {'count': self.count}
+        if len(self.samples) > 0:
+            values = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)) * scale
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary.update({'mean': float(values.mean()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+                            'max': float(values.max())})
+        return summary
+
+
+class PipelineStats:
+    """
+    Rolling timing histograms and counters of a pipeline. Timings are recorded in seconds and reported in ms.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.histograms = {}
+        self.counters = {}
+
+    def record(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = RollingHistogram(self.window)
+        histogram.add(seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def summary(self):
+        return {'timings_ms': {name: histogram.summary(scale=1e3) for name, histogram in list(self.histograms.items())},
+                'counters': dict(self.counters)}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
@@ -1,6 +1,13 @@
 import os
 import json
 import copy
+import time
+import atexit
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 def params_merger(params_prioritized, params):
@@ -9,12 +16,122 @@ def params_merger(params_prioritized, params):
     return merger
 
 
+def stack_frames(frames):
+    """
+    stack frames to a (N, H, W, ...) array if they share the same shape and dtype, otherwise return them as a list
+    """
+    frames = list(frames)
+    if len(frames) > 0 and all(isinstance(frame, np.ndarray) for frame in frames) \
+            and all(frame.shape == frames[0].shape and frame.dtype == frames[0].dtype for frame in frames):
+        return np.stack(frames)
+    return frames
+
+
+class BufferPool:
+    """
+    Reusable output buffers of a layer, keyed by a tag, the shape and the dtype
+    """
+    MAX_BUFFERS = 16
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, tag, shape, dtype, zero=False):
+        key = (tag, tuple(shape), np.dtype(dtype))
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            if len(self.buffers) >= self.MAX_BUFFERS:  # frame size keeps changing
+                self.buffers.clear()
+            buffer = self.buffers[key] = np.zeros(shape, dtype) if zero else np.empty(shape, dtype)
+        return buffer
+
+    def clear(self):
+        self.buffers.clear()
+
+
+class ConfigSync:
+    """
+    Background thread shared by all ConfigLoaders, writing the scheduled parameters and polling watched files.
+    """
+    POLL_INTERVAL = 0.1
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = {}  # loader -> (param, due time)
+        self.watched = {}  # loader -> (callback, interval, next check time)
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def schedule(self, loader, param, delay):
+        with self.cond:
+            due = self.pending[loader][1] if loader in self.pending else time.monotonic() + delay
+            self.pending[loader] = (copy.deepcopy(param), due)
+            self.start()
+            self.cond.notify()
+
+    def flush(self, loader=None):
+        with self.cond:
+            if loader is None:
+                items, self.pending = list(self.pending.items()), {}
+            else:
+                items = [(loader, self.pending.pop(loader))] if loader in self.pending else []
+        for pending_loader, (param, _) in items:
+            pending_loader.write(param)
+
+    def watch(self, loader, callback, interval):
+        with self.cond:
+            self.watched[loader] = (callback, interval, time.monotonic() + interval)
+            self.start()
+
+    def unwatch(self, loader):
+        with self.cond:
+            self.watched.pop(loader, None)
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait(self.POLL_INTERVAL)
+                now = time.monotonic()
+                due = [(loader, param) for loader, (param, t) in self.pending.items() if t <= now]
+                for loader, _ in due:
+                    del self.pending[loader]
+                checks = []
+                for loader, (callback, interval, t) in self.watched.items():
+                    if t <= now and loader not in self.pending:
+                        checks.append((loader, callback))
+                        self.watched[loader] = (callback, interval, now + interval)
+
+            # one failing loader must not stop the thread shared by all the others
+            for loader, param in due:
+                try:
+                    loader.write(param)
+                except Exception:
+                    logger.exception("could not save %s", loader.config_file_path)
+            for loader, callback in checks:
+                try:
+                    if loader.modified():
+                        callback(loader.load({}))
+                except Exception:
+                    logger.exception("could not reload %s", loader.config_file_path)
+
+
 class ConfigLoader:
     USER = 0
     LOCAL = 1
     PACKAGE = 2
+    SYNC = ConfigSync()
 
-    def __init__(self, name, mode=USER):
+    def __init__(self, name, mode=USER, save_delay=0.5):
+        """
+
+        :param save_delay: seconds the writes are delayed and coalesced by a background thread,
+                           write synchronously if 0
+        """
         if mode == self.USER:
             param_dir = os.path.expanduser('~/.cv2_utils/param')
         elif mode == self.LOCAL:
@@ -28,6 +145,8 @@ class ConfigLoader:
             os.makedirs(param_dir)
 
         self.config_file_path = os.path.join(param_dir, name + ".json")
+        self.save_delay = save_delay
+        self.last_mtime = None
 
         if not os.path.exists(os.path.dirname(self.config_file_path)):
             os.makedirs(os.path.dirname(self.config_file_path))
@@ -35,7 +154,7 @@ class ConfigLoader:
     def load(self, default_param):
         param = copy.deepcopy(default_param)
         try:
-
+            self.last_mtime = os.stat(self.config_file_path).st_mtime_ns
             with open(self.config_file_path, 'r') as f:
                 stored_param = json.load(f)
                 if isinstance(stored_param, dict):
@@ -46,5 +165,42 @@ class ConfigLoader:
         return param
 
     def save(self, param):
-        with open(self.config_file_path, 'w') as f:
+        if self.save_delay > 0:
+            self.SYNC.schedule(self, param, self.save_delay)
+        else:
+            self.write(param)
+
+    def flush(self):
+        """
+        write the scheduled parameters now
+        """
+        self.SYNC.flush(self)
+
+    def write(self, param):
+        # write to a temporary file then rename, the config file is never half written
+        tmp_path = "%s.%d.tmp" % (self.config_file_path, os.getpid())
+        with open(tmp_path, 'w') as f:
             json.dump(param, f)
+        os.replace(tmp_path, self.config_file_path)
+        self.last_mtime = os.stat(self.config_file_path).st_mtime_ns
+
+    def modified(self):
+        """
+        whether the config file was modified by someone else since it was last loaded or written
+        """
+        try:
+            return os.stat(self.config_file_path).st_mtime_ns != self.last_mtime
+        except OSError:
+            return False
+
+    def watch(self, callback, interval=1.):
+        """
+        reload the parameters when the config file is modified, checked by the background thread every interval
+        seconds, so that the frame loop does no file I/O
+
+        :param callback: called with the reloaded parameters
+        """
+        self.SYNC.watch(self, callback, interval)
+
+    def unwatch(self):
+        self.SYNC.unwatch(self)
@@ -1,19 +1,49 @@
+import os
+import re
+import glob
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
-import numpy as np
 import time
+import asyncio
+import threading
 from collections import deque
 
 from cv2_utils.layers import SourceLayer
+from cv2_utils import display
+from cv2_utils.frame_cache import FrameCache
+from cv2_utils.recording import Recording
+from cv2_utils.frame import Frame
+from cv2_utils.ros_image import decode_image, decode_compressed_image
 
 
 class VideoCapture(SourceLayer):
     def __init__(self, file_path, layer_name="default", exit_keys=[27, ord('q')], max_fps=0, show_video=False,
-                 show_fps=False, loop=False):
+                 show_fps=False, loop=False, threaded=False, buffer_size=1, drop_policy='oldest', executor=None,
+                 deadline=False, envelope=False, **options):
+        """
+
+        :param max_fps: max rate of the returned frames, frames are returned at absolute deadlines of a monotonic
+                        clock so that the rate does not drift
+        :param deadline: stay real time, the frames whose deadline passed while the previous frames were processed
+                         are skipped without being decoded, the clock runs at max_fps if set, otherwise at the
+                         frame rate of the source (e.g. a video file replayed at camera speed)
+        :param envelope: return Frame envelopes with the sequence number, capture and ingest time of the frames
+
+        :param threaded: grab frames continually on a background thread so that the device buffer never fills up
+        :param buffer_size: number of grabbed frames kept for the consumer when threaded, 1 means latest frame only
+        :param drop_policy: what to do when the buffer is full, 'oldest': drop the stale frame,
+                            'newest': drop the new frame, 'block': stop grabbing until the consumer catches up
+        :param executor: executor running the blocking reads when used with async for,
+                         the default executor of the event loop if None
+        :param options: options of the generator, e.g. cache=True for video files
+        """
         super().__init__(layer_name=layer_name)
 
-        self.gen = Generator.get_generator(file_path, loop)
+        self.gen = Generator.get_generator(file_path, loop, **options)
+        self.executor = executor
+        self.grabber = FrameGrabber(self.gen, buffer_size, drop_policy) if threaded else None
         self.exit_keys = exit_keys
         self.show_video = show_video
         self.show_fps = show_fps
@@ -24,57 +54,266 @@ class VideoCapture(SourceLayer):
 
         self.previous_frames_time = deque(maxlen=5)
 
+        self.deadline = deadline
+        fps = max_fps if max_fps > 0 else (self.gen.frame_rate() if deadline else None)
+        if deadline:
+            assert fps, "deadline mode needs max_fps or a source with a known frame rate"
+            assert not threaded, "frames are already dropped by the grabber thread"
+        self.clock = FrameClock(fps) if fps else None
+        self.processed_frames = 0
+        self.shed_frames = 0
+
+        self.envelope = envelope
+        self.seq = -1  # sequence number of the last read frame in the source
+        self.capture_time = None
+
+    @property
+    def dropped_frames(self):
+        return self.grabber.dropped_frames if self.grabber is not None else 0
+
     def read(self, gray=False):
-        ret, img = self.gen.read()
+        if self.grabber is not None:
+            ret, img = self.grabber.read()
+            self.seq, self.capture_time = self.grabber.seq, self.grabber.capture_time
+        elif self.envelope:  # timestamp between grab and decode
+            ret = self.gen.grab()
+            self.capture_time = time.monotonic()
+            ret, img = self.gen.retrieve() if ret else (False, None)
+            self.seq += 1
+        else:
+            ret, img = self.gen.read()
+            self.seq += 1
         if gray and ret:
             img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         return ret, img
 
+    def read_next(self):
+        """
+        read the next frame, in deadline mode skip the frames whose deadline already passed
+        """
+        if not self.deadline:
+            return self.read()
+
+        late = self.clock.late_frames()
+        if late > 0:
+            self.gen.skip(late)
+            self.clock.skip(late)
+            self.seq += late
+        ret, img = self.read()
+        if ret:  # frames skipped past the end of the source are not counted
+            self.shed_frames += late
+        return ret, img
+
     def show_frame(self, frame):
         if self.last_frame is not None:
-
-            # add fps display
-            if self.show_fps and len(self.previous_frames_time) == self.previous_frames_time.maxlen:
-                fps = (self.previous_frames_time.maxlen - 1) / (
-                            self.previous_frames_time[-1] - self.previous_frames_time[0])
-                cv2.putText(self.last_frame, 'FPS: %d' % round(fps), (5, 25), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 0, 0),
-                            2)
-
-            cv2.imshow(self.layer_name, self.last_frame)
+            display.show(self.layer_name, self.last_frame, self.draw_fps if self.show_fps else None)
         self.last_frame = frame
 
+    def draw_fps(self, frame):
+        if len(self.previous_frames_time) == self.previous_frames_time.maxlen:
+            fps = (self.previous_frames_time.maxlen - 1) / (
+                        self.previous_frames_time[-1] - self.previous_frames_time[0])
+            frame = frame.copy()  # the frame belongs to the caller and may be a read-only map
+            cv2.putText(frame, 'FPS: %d' % round(fps), (5, 25), cv2.FONT_HERSHEY_COMPLEX, 1, (255, 0, 0), 2)
+        return frame
+
     def __iter__(self):
-        # TODO low fps for stream device such as video would cause buffer emit and result in high time delay
-        # use a Thread/Process to continually clear the buffer and reduce the time delay
         return self
 
     def __next__(self):
-        ret, frame = self.read()
+        ret, frame = self.read_next()
 
-        self.last_pressed_key = cv2.waitKey(1)
+        # GUI event pump of inline mode, no GUI call in headless mode, key of the display thread in thread mode
+        self.last_pressed_key = display.wait_key()
         if (not ret) or self.last_pressed_key in self.exit_keys:
             raise StopIteration
 
         if self.show_video:
             self.show_frame(frame)
 
-        # fps limit
-        current_time = time.time_ns() / 1e9
-        if len(self.previous_frames_time) > 0 and self.max_fps > 0:
-            dt = current_time - self.previous_frames_time[-1]
-            sleep_time = 1. / self.max_fps - dt
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-        self.previous_frames_time.append(time.time_ns() / 1e9)
+        sleep_time = self.throttle_delay()
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        if self.clock is not None:
+            self.clock.tick()
+        self.processed_frames += 1
+        self.previous_frames_time.append(time.monotonic())
 
+        if self.envelope:
+            return Frame(frame, self.seq, self.capture_time, self.previous_frames_time[-1])
         return frame
 
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        ret, frame = await loop.run_in_executor(self.executor, self.read_next)
+
+        # GUI event pump of inline mode, no GUI call in headless mode, key of the display thread in thread mode
+        self.last_pressed_key = display.wait_key()
+        if (not ret) or self.last_pressed_key in self.exit_keys:
+            raise StopAsyncIteration
+
+        if self.show_video:
+            self.show_frame(frame)
+
+        sleep_time = self.throttle_delay()
+        if sleep_time > 0:
+            await asyncio.sleep(sleep_time)
+        if self.clock is not None:
+            self.clock.tick()
+        self.processed_frames += 1
+        self.previous_frames_time.append(time.monotonic())
+
+        if self.envelope:
+            return Frame(frame, self.seq, self.capture_time, self.previous_frames_time[-1])
+        return frame
+
+    def throttle_delay(self):
+        """
+        :return: time to wait before returning the frame at its deadline
+        """
+        if self.clock is None:
+            return 0
+        return self.clock.delay()
+
     def get_last_pressed_key(self):
         return self.last_pressed_key
 
+    def release(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+        self.gen.release()
+
+
+class FrameClock:
+    """
+    Deadlines of the frames of a stream at a fixed rate, frame i is due at start + i / fps of a monotonic clock,
+    so that the waiting errors of the frames do not add up.
+    """
+
+    def __init__(self, fps):
+        self.period = 1. / fps
+        self.start = None
+        self.index = 0  # index of the next frame
+
+    def next_deadline(self):
+        if self.start is None:
+            self.start = time.monotonic()
+        return self.start + self.index * self.period
+
+    def delay(self):
+        """
+        :return: time to wait until the deadline of the next frame, after a stall of more than one period
+                 the clock is shifted instead of returning the late frames in a burst
+        """
+        delay = self.next_deadline() - time.monotonic()
+        if delay < -self.period:
+            self.start -= delay
+            return 0
+        return delay
+
+    def late_frames(self):
+        """
+        :return: number of frames after the next one whose deadline already passed
+        """
+        late = time.monotonic() - self.next_deadline()
+        return int(late / self.period) if late > 0 else 0
+
+    def skip(self, n):
+        self.index += n
+
+    def tick(self):
+        self.index += 1
+
+
+class FrameGrabber:
+    """
+    Continually read frames from a generator on a background thread and keep a bounded buffer of them,
+    so that a slow consumer always gets recent frames instead of the stale ones piled up in the device buffer.
+    """
+    DROP_OLDEST = 'oldest'
+    DROP_NEWEST = 'newest'
+    BLOCK = 'block'
+
+    def __init__(self, gen, maxsize=1, drop_policy=DROP_OLDEST):
+        assert maxsize >= 1
+        assert drop_policy in [self.DROP_OLDEST, self.DROP_NEWEST, self.BLOCK], "invalid drop policy"
+
+        self.gen = gen
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+
+        self.buffer = deque()
+        self.cond = threading.Condition()
+        self.grabbed_frames = 0
+        self.dropped_frames = 0
+        self.seq = -1  # sequence number and grab time (time.monotonic) of the last read frame
+        self.capture_time = None
+        self.finished = False
+        self.stopped = False
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped:
+            ret, frame = self.gen.read()
+            capture_time = time.monotonic()
+            with self.cond:
+                if not ret:
+                    self.finished = True
+                    self.cond.notify_all()
+                    return
+
+                self.grabbed_frames += 1
+                if len(self.buffer) >= self.maxsize:
+                    if self.drop_policy == self.BLOCK:
+                        while len(self.buffer) >= self.maxsize and not self.stopped:
+                            self.cond.wait()
+                    elif self.drop_policy == self.DROP_NEWEST:
+                        self.dropped_frames += 1
+                        continue
+                    else:
+                        self.buffer.popleft()
+                        self.dropped_frames += 1
+
+                self.buffer.append((frame, self.grabbed_frames - 1, capture_time))
+                self.cond.notify_all()
+
+    def read(self):
+        with self.cond:
+            while not self.buffer and not self.finished and not self.stopped:
+                self.cond.wait()
+            if not self.buffer:
+                return False, None
+            frame, self.seq, self.capture_time = self.buffer.popleft()
+            self.cond.notify_all()
+        return True, frame
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join(timeout=1)
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.bmp')
+
+
+def has_magic(path):
+    """
+    whether path is a glob pattern, an existing path is literal even if its name contains *, ? or [
+    """
+    return re.search('[*?[]', path) is not None and not os.path.exists(path)
+
 
 class Generator:
     GENERATORS = []
+    # dispatch tables, generators are picked by the type, the scheme ('ros://...') or the extension of
+    # file_path before falling back to check(), PROBE marks generators whose check() is expensive
+    TYPES = ()
+    SCHEMES = ()
+    EXTENSIONS = ()
+    PROBE = False
 
     def __init__(self, file_path, loop):
         self.file_path = file_path
@@ -94,19 +333,85 @@ class Generator:
     def read(self):
         return False, None
 
+    def skip(self, n=1):
+        """
+        skip the next n frames, return False if the generator ended
+        """
+        for _ in range(n):
+            if not self.read()[0]:
+                return False
+        return True
+
+    def grab(self):
+        """
+        grab the next frame, which is decoded by retrieve(), return False if the generator ended
+        """
+        self.grabbed = self.read()
+        return self.grabbed[0]
+
+    def retrieve(self):
+        ret, frame = self.grabbed
+        self.grabbed = (False, None)
+        return ret, frame
+
+    def frame_rate(self):
+        """
+        :return: rate of the frames returned by read() in the source time, None if unknown
+        """
+        return None
+
+    def release(self):
+        pass
+
     @classmethod
     def check(cls, file_path):
         return False
 
     @classmethod
-    def get_generator(cls, file_path, loop):
+    def dispatch(cls, file_path):
+        """
+        :return: generator class of file_path and the path passed to it, None if it should be probed
+        """
         for gen in cls.GENERATORS:
-            if gen.check(file_path):
-                return gen(file_path, loop)
+            if gen.TYPES and isinstance(file_path, gen.TYPES):
+                return gen, file_path
+        if not isinstance(file_path, str):
+            return None, file_path
+
+        scheme, sep, path = file_path.partition('://')
+        if sep:
+            scheme = scheme.lower()
+            if scheme == 'file':
+                file_path = path
+            else:
+                for gen in cls.GENERATORS:
+                    if scheme in gen.SCHEMES:
+                        return gen, file_path
+                return None, file_path
+
+        if not has_magic(file_path):
+            extension = os.path.splitext(file_path)[1].lower()
+            for gen in cls.GENERATORS:
+                if extension in gen.EXTENSIONS:
+                    return gen, file_path
+        return None, file_path
+
+    @classmethod
+    def get_generator(cls, file_path, loop, **options):
+        gen, file_path = cls.dispatch(file_path)
+        if gen is not None:
+            return gen(file_path, loop, **options)
+
+        for probe in [False, True]:
+            for gen in cls.GENERATORS:
+                if gen.PROBE == probe and gen.check(file_path):
+                    return gen(file_path, loop, **options)
         assert False, "no valid generator"
 
 
 class ImageGenerator(Generator):
+    EXTENSIONS = IMAGE_EXTENSIONS
+
     def __init__(self, file_path, loop):
         super().__init__(file_path, loop)
 
@@ -125,43 +430,327 @@ class ImageGenerator(Generator):
     def check(cls, file_path):
         if not isinstance(file_path, str):
             return False
-        file_path = file_path.lower()
-        if file_path.endswith('.jpg') or file_path.endswith('.jpeg') \
-                or file_path.endswith('.png') or file_path.endswith('.tiff') \
-                or file_path.endswith('.bmp'):
-            return True
-        return False
+        if has_magic(file_path):  # pattern of an image sequence
+            return False
+        return file_path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class RecordingGenerator(Generator):
+    """
+    Replay a Recording of raw frames, frames are read-only memory maps of the chunk files and are not copied,
+    so that the replayed inputs are always the recorded ones. Copy a frame before drawing on it.
+    """
+    EXTENSIONS = ('.rec',)
+
+    def __init__(self, file_path, loop, realtime=False):
+        """
+
+        :param realtime: replay at the original timing of the frames, as fast as possible if False
+        """
+        super().__init__(file_path, loop)
+        self.recording = Recording(file_path)
+        self.realtime = realtime
+        self.timestamp = None  # capture timestamp of the last read frame
+        self.reset()
+
+    def reset(self):
+        self.chunk_index = -1
+        self.frames, self.timestamps = None, None
+        self.index = 0
+        self.start = None  # (monotonic time, timestamp) of the first replayed frame
+
+    def next_index(self):
+        """
+        move to the next frame, return False if the recording ended
+        """
+        while self.frames is None or self.index >= len(self.frames):
+            if self.chunk_index + 1 >= len(self.recording.chunks):
+                if not self.loop or self.recording.count == 0:
+                    return False
+                self.reset()
+            self.chunk_index += 1
+            self.frames, self.timestamps = self.recording.load_chunk(self.chunk_index)
+            self.index = 0
+        self.index += 1
+        return True
+
+    def skip(self, n=1):
+        for _ in range(n):
+            if not self.next_index():
+                return False
+        return True
+
+    def read(self):
+        if not self.next_index():
+            return False, None
+        self.timestamp = float(self.timestamps[self.index - 1])
+
+        if self.realtime:
+            if self.start is None:
+                self.start = (time.monotonic(), self.timestamp)
+            delay = self.start[0] + self.timestamp - self.start[1] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return True, self.frames[self.index - 1]
+
+    def frame_rate(self):
+        if self.recording.count < 2:
+            return None
+        first = self.recording.load_chunk(0)[1][0]
+        last = self.recording.load_chunk(len(self.recording.chunks) - 1)[1][-1]
+        return (self.recording.count - 1) / (last - first) if last > first else None
+
+    @classmethod
+    def check(cls, file_path):
+        return Recording.is_recording(file_path)
+
+
+class ImageSequenceGenerator(Generator):
+    TYPES = (list, tuple)
+    REDUCE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                    8: cv2.IMREAD_REDUCED_COLOR_8}
+
+    def __init__(self, file_path, loop, workers=None, prefetch=16, reduce=1, size=None):
+        """
+
+        :param file_path: directory, glob pattern or list of image paths, read in sorted order (list order for list)
+        :param workers: number of decoding threads, number of cpus if None
+        :param prefetch: max number of images decoded ahead
+        :param reduce: downscale by 1, 2, 4 or 8 while decoding, which is much faster for JPEG
+        :param size: (width, height) the images are resized to after decoding
+        """
+        super().__init__(file_path, loop)
+
+        self.paths = self.list_paths(file_path)
+        assert len(self.paths) > 0, "no image found in %s" % file_path
+        assert reduce in self.REDUCE_FLAGS, "reduce should be 1, 2, 4 or 8"
+
+        self.flags = self.REDUCE_FLAGS[reduce]
+        self.size = tuple(size) if size is not None else None
+        self.prefetch = max(prefetch, 1)
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+        self.pending = deque()
+        self.next_index = 0
+        self.skipped = 0  # images that could not be decoded
+
+    @staticmethod
+    def list_paths(file_path):
+        if isinstance(file_path, (list, tuple)):
+            return list(file_path)
+        if os.path.isdir(file_path):
+            return sorted(os.path.join(file_path, name) for name in os.listdir(file_path)
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+        return sorted(glob.glob(file_path))
+
+    def load(self, path):
+        img = cv2.imread(path, self.flags)  # releases the GIL
+        if img is not None and self.size is not None and (img.shape[1], img.shape[0]) != self.size:
+            img = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        return img
+
+    def fill(self):
+        while len(self.pending) < self.prefetch:
+            if self.next_index >= len(self.paths):
+                if not self.loop:
+                    return
+                self.next_index = 0
+            self.pending.append(self.executor.submit(self.load, self.paths[self.next_index]))
+            self.next_index += 1
+
+    def read(self):
+        for _ in range(len(self.paths)):
+            self.fill()
+            if not self.pending:
+                return False, None
+            img = self.pending.popleft().result()
+            if img is not None:
+                return True, img
+            self.skipped += 1
+        return False, None
+
+    def skip(self, n=1):
+        for _ in range(n):
+            self.fill()
+            if not self.pending:
+                return False
+            self.pending.popleft().cancel()
+        return True
+
+    def release(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=False)
+
+    @classmethod
+    def check(cls, file_path):
+        if isinstance(file_path, (list, tuple)):
+            return len(file_path) > 0 and all(isinstance(path, str) for path in file_path)
+        if not isinstance(file_path, str):
+            return False
+        return os.path.isdir(file_path) or has_magic(file_path)
 
 
 class VideoGenerator(Generator):
-    def __init__(self, file_path, loop):
+    EXTENSIONS = ('.mp4', '.avi')
+
+    def __init__(self, file_path, loop, stride=1, start=0, end=None, start_time=None, end_time=None,
+                 seek_threshold=300, cache=False, cache_dir=None, cache_size_limit=FrameCache.DEFAULT_SIZE_LIMIT):
+        """
+
+        :param stride: read every stride-th frame, skipped frames are grabbed without being decoded to BGR
+        :param start: index of the first frame
+        :param end: index of the frame after the last one, read until the end of the video if None
+        :param start_time: start in seconds, overrides start
+        :param end_time: end in seconds, overrides end
+        :param seek_threshold: jumps of more frames are done by seeking, which decodes from the previous keyframe,
+                               instead of grabbing every skipped frame
+        :param cache: keep the decoded frames in a memory mapped file, so that later passes of a loop
+                      (and later runs on the same file) do not decode the video again, the frames are
+                      copied from the cache so they could be modified in place
+        :param cache_dir: directory of the cached frames, ~/.cv2_utils/cache if None
+        :param cache_size_limit: max bytes of the cache directory, least recently used videos are evicted
+        """
         super().__init__(file_path, loop)
 
         self.cap = cv2.VideoCapture(file_path)
         assert self.cap.read()[0]
+
+        assert stride >= 1
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if start_time is not None or end_time is not None:
+            assert self.fps > 0, "unknown fps of %s" % file_path
+        self.stride = stride
+        self.start = int(round(start_time * self.fps)) if start_time is not None else start
+        self.end = int(round(end_time * self.fps)) if end_time is not None else end
+        self.seek_threshold = seek_threshold
         self.reset()
 
+        self.cache = None
+        self.cached_frames = None
+        self.cache_index = 0
+        if cache:
+            self.cache = FrameCache(FrameCache.make_key(file_path, self.start, self.end, self.stride),
+                                    cache_dir, cache_size_limit)
+            self.cached_frames = self.cache.load()
+            if self.cached_frames is None:
+                frame_nbytes = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) \
+                    * int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3
+                count = max(int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+                if self.end is not None:
+                    count = min(count, self.end)
+                n_frames = max(-(-(count - self.start) // self.stride), 0)  # frames of the cached range
+                self.cache.begin(n_frames * frame_nbytes)
+
     def reset(self):
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.seek(self.start)
+        self.pending_skip = 0
+
+    def seek(self, index):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.pos = index
+
+    def grab_frames(self, n):
+        """
+        move n frames forward without decoding them
+        """
+        if n > self.seek_threshold:
+            self.seek(self.pos + n)
+            return True
+        for _ in range(n):
+            if not self.cap.grab():
+                return False
+            self.pos += 1
+        return True
+
+    def frame_rate(self):
+        return self.fps / self.stride if self.fps > 0 else None
+
+    def skip(self, n=1):
+        if self.cached_frames is not None:
+            self.cache_index += n
+            return True
+        if self.cache is not None and self.cache.writing:  # the cached pass would miss frames
+            self.cache.abort()
+        self.pending_skip += n * self.stride
+        return True
+
+    def grab_next(self):
+        if self.pending_skip > 0:
+            n, self.pending_skip = self.pending_skip, 0
+            if self.end is not None:
+                n = min(n, max(self.end - self.pos, 0))
+            if not self.grab_frames(n):
+                return False
+
+        if self.end is not None and self.pos >= self.end:
+            return False
+        if not self.cap.grab():
+            return False
+        self.pos += 1
+        self.pending_skip = self.stride - 1
+        return True
+
+    def decode(self):
+        if not self.grab_next():
+            return False, None
+        return self.cap.retrieve()
+
+    def grab(self):
+        if self.cache is not None:
+            return super().grab()
+        if self.grab_next():
+            return True
+        if self.loop:
+            self.reset()
+            return self.grab_next()
+        return False
+
+    def retrieve(self):
+        if self.cache is not None:
+            return super().retrieve()
+        return self.cap.retrieve()
+
+    def read_cached(self):
+        if self.cache_index >= len(self.cached_frames):
+            if not self.loop:
+                return False, None
+            self.cache_index %= len(self.cached_frames)
+        # copied like a decoded frame, in-place drawing must not reach the cache and the next passes
+        frame = self.cached_frames[self.cache_index].copy()
+        self.cache_index += 1
+        return True, frame
 
     def read(self):
-        ret, frame = self.cap.read()
+        if self.cached_frames is not None:
+            return self.read_cached()
+
+        ret, frame = self.decode()
+        if self.cache is not None and self.cache.writing:
+            if ret:
+                self.cache.write(frame)
+            else:  # first pass completed, the next passes are read from the cache
+                self.cached_frames = self.cache.finish()
+                if self.cached_frames is not None:
+                    self.cache_index = len(self.cached_frames)
+                    return self.read_cached()
+
         if (not ret) and self.loop:
             self.reset()
-            ret, frame = self.cap.read()
+            ret, frame = self.decode()
         return ret, frame
 
     @classmethod
     def check(cls, file_path):
         if not isinstance(file_path, str):
             return False
-        file_path = file_path.lower()
-        if file_path.endswith('.mp4') or file_path.endswith('.avi'):
-            return True
-        return False
+        return file_path.lower().endswith(cls.EXTENSIONS)
 
 
 class CameraGenerator(Generator):
+    TYPES = (int,)
+    SCHEMES = ('http', 'https', 'rtsp')
+
     def __init__(self, file_path, loop):
         super().__init__(file_path, loop)
 
@@ -170,6 +759,12 @@ class CameraGenerator(Generator):
     def read(self):
         return self.cap.read()
 
+    def grab(self):
+        return self.cap.grab()
+
+    def retrieve(self):
+        return self.cap.retrieve()
+
     @classmethod
     def check(cls, file_path):
         if isinstance(file_path, int):
@@ -182,33 +777,31 @@ class CameraGenerator(Generator):
 
 
 class RosVideoGenerator(Generator):
+    SCHEMES = ('ros',)
+    PROBE = True  # asks the ROS master for the published topics
+
     def __init__(self, file_path, loop):
+        if file_path.startswith('ros://'):  # ros:///camera/image_raw
+            file_path = '/' + file_path[len('ros://'):].lstrip('/')
         super().__init__(file_path, loop)
 
         import rospy
-        from sensor_msgs.msg import Image
+        from sensor_msgs.msg import Image, CompressedImage
         from queue import Queue
-        rospy.init_node('ros_video_capture', anonymous=True)
-        self.image_sub = rospy.Subscriber(file_path, Image, self.callback)
         self.image_queue = Queue(maxsize=3)
+        rospy.init_node('ros_video_capture', anonymous=True)
+        if file_path.rstrip('/').endswith(('compressed', 'compressedDepth')):  # image_transport compressed topics
+            self.image_sub = rospy.Subscriber(file_path, CompressedImage, self.compressed_callback)
+        else:
+            self.image_sub = rospy.Subscriber(file_path, Image, self.callback)
 
     def callback(self, data):
-        # decode ros Image msg to cv image, TODO test all encodings
-        encoding = data.encoding
-        if encoding.endswith("8"):
-            image = np.frombuffer(data.data, dtype=np.uint8)
-        elif encoding.endswith("16"):
-            image = np.frombuffer(data.data, dtype=np.uint16)
-        else:
-            assert False, "unsupported encoding type"
+        self.put(decode_image(data))
 
-        if encoding.startswith('mono'):
-            image = image.reshape((data.height, data.width))
-        else:
-            image = image.reshape((data.height, data.width, -1))
-            if encoding.startswith("rgb"):
-                image[..., :3] = image[..., -2::-1]
+    def compressed_callback(self, data):
+        self.put(decode_compressed_image(data))
 
+    def put(self, image):
         if self.image_queue.full():
             self.image_queue.get_nowait()
         self.image_queue.put_nowait(image)
@@ -237,6 +830,8 @@ class Kinect2Generator(Generator):
 
     @classmethod
     def check(cls, file_path):
+        if not type(file_path).__module__.startswith('pykinect2'):
+            return False
         try:
             from pykinect2 import PyKinectRuntime
             if isinstance(file_path, PyKinectRuntime.PyKinectRuntime):
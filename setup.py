@@ -8,7 +8,7 @@ setup(
     author = 'Tu Yuxiao',
     author_email = '754738085@qq.com',
     url = 'https://github.com/TuYuxiao/cv2_utils',
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmarks', 'benchmarks.*']),
     include_package_data = True,
     platforms = 'any',
     install_requires = ['opencv-python'],